@@ -2,6 +2,16 @@ import random
 import os
 import shutil
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# files a running server never rewrites; these are hardlinked from the template
+IMMUTABLE_SUFFIXES = (".jar",)
+
+FICLONE = 0x40049409
+
  
 def generateID(length):
     r = ""
@@ -11,4 +21,43 @@ def generateID(length):
     return r
 
 def copyServer(templateName: str, serverId: str):
-    shutil.copytree("templates\\" + templateName + "\\world", "running\\" + serverId)
+    provisionTree("templates\\" + templateName + "\\world", "running\\" + serverId)
+
+def provisionTree(src: str, dst: str, link: bool = True) -> dict:
+    """
+    Copies a template directory for a new server. With link set, immutable files
+    are hardlinked and everything else is reflinked (copy-on-write clone) where the
+    filesystem supports it, so only files the server may modify cost real I/O.
+    Returns how many files went each way and how many bytes were really copied.
+    """
+    stats = {"linked": 0, "reflinked": 0, "copied": 0, "bytesCopied": 0}
+
+    def place(s, d):
+        if link and s.endswith(IMMUTABLE_SUFFIXES):
+            try:
+                os.link(s, d)
+                stats["linked"] += 1
+                return d
+            except OSError:
+                pass
+        if link and _reflink(s, d):
+            stats["reflinked"] += 1
+            return d
+        shutil.copy2(s, d)
+        stats["copied"] += 1
+        stats["bytesCopied"] += os.path.getsize(d)
+        return d
+
+    shutil.copytree(src, dst, copy_function = place)
+    return stats
+
+def _reflink(src: str, dst: str) -> bool:
+    if fcntl is None:
+        return False
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            return False
+    shutil.copystat(src, dst)
+    return True
@@ -0,0 +1,185 @@
+import math
+import threading
+import time
+import traceback
+
+import logger
+import rsglobal
+
+LIVE = (rsglobal.SERVER_STATUS.SETUP, rsglobal.SERVER_STATUS.LOADING, rsglobal.SERVER_STATUS.RUNNING)
+
+class Policy:
+    """
+    How one server type scales. The controller keeps at least `headroom` free
+    player slots after projecting the current player trend `lead` seconds
+    ahead (about the time a new server needs to come up). A server is only
+    retired once the fleet would still have headroom + `band` free slots
+    without it, and has stayed that way for `idle` seconds; that gap between
+    the scale-up and scale-down thresholds is what stops it from flapping.
+    """
+
+    def __init__(self, headroom = 20, band = 10, idle = 300, lead = 60, minimum = 1, maximum = 50, **kwargs):
+        self.headroom = headroom
+        self.band = band
+        self.idle = idle
+        self.lead = lead
+        self.minimum = minimum
+        self.maximum = maximum
+        self.version = kwargs.get("version", rsglobal.SERVER_TEMPLATES.STANDARD_1_8_8)
+        self.ramId = kwargs.get("ramId", "S")
+        self.slots = kwargs.get("slots", 20)
+        self.smoothing = kwargs.get("smoothing", 0.3)
+        self.drainTimeout = kwargs.get("drainTimeout", 600)
+        self.bungee = kwargs.get("bungee", False)
+
+
+class TypeState:
+
+    def __init__(self):
+        self.players = None
+        self.rate = 0.0
+        self.seen = None
+        self.surplusSince = None
+
+
+class Autoscaler:
+    """
+    Watches player counts per server type (0xf0) and, for types whose Policy
+    sets `bungee`, the network total from BungeeCord's 0xe0 poll. It asks
+    provision(type, count) for servers ahead of demand and drains surplus
+    ones: a draining server is left out of the 0xe2 list so it gets no new
+    players, and is shut down once empty or after the policy's drainTimeout.
+    provision and retire default to a provision.Provisioner and
+    DynamicServer.shutdown(); the simulation in bench_autoscale.py swaps in
+    its own.
+    """
+
+    def __init__(self, registry, policies, **kwargs):
+        self.registry = registry
+        self.policies = dict(policies)
+        self.bungee = kwargs.get("bungee")
+        self.interval = kwargs.get("interval", 5)
+        self.provisioner = kwargs.get("provisioner")
+        self.provision = kwargs.get("provision", self._provision)
+        self.retire = kwargs.get("retire", lambda server: server.shutdown())
+        self.clock = kwargs.get("clock", time.time)
+        self.states = {typ: TypeState() for typ in self.policies}
+        self.draining = {}
+        self.events = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.LOG = logger.Logger(self)
+
+    def setPolicy(self, typ, policy):
+        with self.lock:
+            if policy is None:
+                self.policies.pop(typ, None)
+                self.states.pop(typ, None)
+            else:
+                self.policies[typ] = policy
+                self.states.setdefault(typ, TypeState())
+
+    def start(self):
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception:
+                self.LOG.error("Autoscaler tick failed:\n" + traceback.format_exc())
+
+    def tick(self, now = None):
+        if now is None:
+            now = self.clock()
+        with self.lock:
+            self._drain(now)
+            for typ, policy in self.policies.items():
+                self._scale(typ, policy, self.states[typ], now)
+
+    def status(self, typ):
+        """Live, draining and pending server counts, players, capacity and projected demand of one type"""
+        policy = self.policies[typ]
+        state = self.states[typ]
+        servers = [i for i in self.registry.getByType(typ) if i.status in LIVE and not i.pooled]
+        active = [i for i in servers if not i.draining]
+        return {
+            "servers": len(active),
+            "draining": len(servers) - len(active),
+            "pending": len([i for i in active if i.status != rsglobal.SERVER_STATUS.RUNNING]),
+            "players": sum(len(i.players) for i in servers),
+            "capacity": sum(i.maxplayers for i in active),
+            "demand": self._demand(policy, state, servers)
+        }
+
+    def _scale(self, typ, policy, state, now):
+        servers = [i for i in self.registry.getByType(typ) if i.status in LIVE and not i.pooled]
+        active = [i for i in servers if not i.draining]
+        players = self._players(policy, servers)
+
+        if state.seen is not None and now > state.seen:
+            rate = (players - state.players) / (now - state.seen)
+            state.rate += policy.smoothing * (rate - state.rate)
+        state.players = players
+        state.seen = now
+
+        demand = self._demand(policy, state, servers)
+        free = sum(i.maxplayers for i in active) - demand
+
+        if free < policy.headroom or len(active) < policy.minimum:
+            state.surplusSince = None
+            need = max(math.ceil((policy.headroom - free) / policy.slots), policy.minimum - len(active))
+            need = min(need, policy.maximum - len(active))
+            if need > 0:
+                self._event(now, typ, "up", need, players, free)
+                self.provision(typ, need)
+            return
+
+        running = [i for i in active if i.status == rsglobal.SERVER_STATUS.RUNNING]
+        victim = min(running, key = lambda i: len(i.players), default = None)
+        if victim is None or len(active) <= policy.minimum or free - victim.maxplayers < policy.headroom + policy.band:
+            state.surplusSince = None
+            return
+        if state.surplusSince is None:
+            state.surplusSince = now
+        if now - state.surplusSince < policy.idle:
+            return
+        state.surplusSince = None
+        victim.draining = True
+        self.registry.changed(victim)
+        self.draining[victim.fullId] = (victim, now + policy.drainTimeout)
+        self._event(now, typ, "drain", 1, players, free)
+
+    def _drain(self, now):
+        for fullId, (server, deadline) in list(self.draining.items()):
+            if server not in self.registry or server.status not in LIVE:
+                del self.draining[fullId]
+            elif not server.players or now >= deadline:
+                del self.draining[fullId]
+                self._event(now, server.type, "retire", 1, len(server.players), None)
+                self.retire(server)
+
+    def _players(self, policy, servers):
+        players = sum(len(i.players) for i in servers)
+        if policy.bungee and self.bungee is not None:
+            players = max(players, self.bungee.playeramt)
+        return players
+
+    def _demand(self, policy, state, servers):
+        players = self._players(policy, servers)
+        return players + max(0.0, state.rate) * policy.lead
+
+    def _event(self, now, typ, action, count, players, free):
+        self.events.append((now, typ, action, count))
+        if len(self.events) > 1000:
+            del self.events[:500]
+        if action == "up":
+            self.LOG.info(f"Scaling {typ} up by {count} ({players} players, {free:.0f} free slots projected)")
+        elif action == "drain":
+            self.LOG.info(f"Draining one {typ} server ({players} players, {free:.0f} free slots projected)")
+
+    def _provision(self, typ, count):
+        policy = self.policies[typ]
+        self.provisioner.request(policy.version, policy.ramId, count, type = typ, maxplayers = policy.slots)
@@ -0,0 +1,218 @@
+"""
+Offline simulation of the autoscaler.
+
+Replays a player-count trace for one server type against autoscale.Autoscaler
+on a simulated clock, with fake servers that take --setup + --boot seconds to
+come up, and reports what the policy cost (server hours) and what it missed
+(players that found no free slot). The trace is a CSV of "seconds,players",
+the summed player history of a type from a metrics snapshot, or synthetic.
+
+    python bench_autoscale.py --synthetic 24 --headroom 20 --band 10 --idle 300
+    python bench_autoscale.py --trace players.csv --lead 0
+    python bench_autoscale.py --snapshot fleet.rsmt --type verify --static 12
+"""
+import argparse
+import bisect
+import csv
+import math
+import random
+
+import autoscale
+import metrics
+import rsglobal
+
+
+class SimServer:
+
+    def __init__(self, n, typ, slots):
+        self.id = "%04d" % n
+        self.ramId = "S"
+        self.type = typ
+        self.maxplayers = slots
+        self.players = []
+        self.pooled = False
+        self.draining = False
+        self.registered = False
+        self.registry = None
+        self._status = rsglobal.SERVER_STATUS.SETUP
+
+    @property
+    def fullId(self):
+        return self.ramId + self.id
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        old = self._status
+        self._status = value
+        if self.registry is not None and old != value:
+            self.registry.updateStatus(self, old, value)
+
+
+class Simulation:
+
+    def __init__(self, typ, policy, setup, boot, stop):
+        self.typ = typ
+        self.policy = policy
+        self.setup = setup
+        self.boot = boot
+        self.stop = stop
+        self.now = 0.0
+        self.registry = rsglobal.ServerRegistry()
+        self.pending = []
+        self.count = 0
+        self.serverSeconds = 0.0
+        self.rejected = 0.0
+        self.peak = 0
+        self.scaler = autoscale.Autoscaler(self.registry, {typ: policy}, provision = self.provision, retire = self.retire, clock = lambda: self.now)
+
+    def provision(self, typ, count):
+        for n in range(count):
+            self.count += 1
+            server = SimServer(self.count, typ, self.policy.slots)
+            self.registry.append(server)
+            self.pending.append((self.now + self.setup, server, rsglobal.SERVER_STATUS.LOADING))
+            self.pending.append((self.now + self.setup + self.boot, server, rsglobal.SERVER_STATUS.RUNNING))
+
+    def retire(self, server):
+        self.pending.append((self.now + self.stop, server, None))
+
+    def advance(self, dt):
+        self.now += dt
+        due = [i for i in self.pending if i[0] <= self.now]
+        self.pending = [i for i in self.pending if i[0] > self.now]
+        for t, server, status in sorted(due, key = lambda i: i[0]):
+            if status is None:
+                server.players.clear()
+                self.registry.discard(server)
+            elif server in self.registry:
+                server.status = status
+        servers = list(self.registry)
+        self.serverSeconds += len(servers) * dt
+        self.peak = max(self.peak, len(servers))
+
+    def seat(self, target, dt):
+        """Move the seated player count toward target; whoever finds no open slot is rejected"""
+        servers = [i for i in self.registry if i.status == rsglobal.SERVER_STATUS.RUNNING]
+        seated = sum(len(i.players) for i in servers)
+        while seated > target:
+            donor = max(servers, key = lambda i: (i.draining and bool(i.players), len(i.players)))
+            donor.players.pop()
+            seated -= 1
+        open = [i for i in servers if not i.draining and len(i.players) < i.maxplayers]
+        while seated < target and open:
+            server = min(open, key = lambda i: len(i.players))
+            server.players.append(None)
+            seated += 1
+            if len(server.players) >= server.maxplayers:
+                open.remove(server)
+        self.rejected += (target - seated) * dt
+
+
+def synthetic(hours, peak, seed):
+    """A day-shaped curve with noise and a few sudden spikes, one point per minute"""
+    rng = random.Random(seed)
+    trace = []
+    spikes = [rng.uniform(0, hours * 3600) for n in range(max(1, hours // 8))]
+    for t in range(0, hours * 3600 + 1, 60):
+        day = 0.55 - 0.45 * math.cos(2 * math.pi * (t / 86400 - 0.15))
+        spike = sum(0.4 * math.exp(-((t - s) / 600) ** 2) for s in spikes)
+        trace.append((t, max(0, round(peak * min(1.0, day + spike) + rng.gauss(0, peak * 0.02)))))
+    return trace
+
+def loadTrace(path):
+    trace = []
+    with open(path, newline = "") as f:
+        for row in csv.reader(f):
+            try:
+                trace.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                continue
+    start = trace[0][0]
+    return [(t - start, p) for t, p in trace]
+
+def snapshotTrace(path, typ, width):
+    store = metrics.MetricsStore.load(path)
+    totals = {}
+    for fullId, series in store.series.items():
+        if series.type != typ:
+            continue
+        for t, players in series.rollups[width].values("players"):
+            totals[t] = totals.get(t, 0) + players
+    trace = sorted(totals.items())
+    start = trace[0][0]
+    return [(t - start, round(p)) for t, p in trace]
+
+def playersAt(trace, times, t):
+    n = bisect.bisect_right(times, t) - 1
+    if n + 1 >= len(trace):
+        return trace[-1][1]
+    (t0, p0), (t1, p1) = trace[n], trace[n + 1]
+    return round(p0 + (p1 - p0) * (t - t0) / (t1 - t0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Replay a player-count trace against the autoscaler")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--trace", help = "CSV of seconds,players")
+    source.add_argument("--snapshot", help = "metrics snapshot (.rsmt) to sum player history from")
+    source.add_argument("--synthetic", type = int, default = 24, help = "hours of synthetic trace (default)")
+    parser.add_argument("--type", default = "verify")
+    parser.add_argument("--width", type = int, default = 60, help = "snapshot rollup to read, in seconds")
+    parser.add_argument("--peak", type = int, default = 400, help = "synthetic peak players")
+    parser.add_argument("--seed", type = int, default = 1)
+    parser.add_argument("--headroom", type = int, default = 20)
+    parser.add_argument("--band", type = int, default = 10)
+    parser.add_argument("--idle", type = float, default = 300)
+    parser.add_argument("--lead", type = float, default = 60)
+    parser.add_argument("--slots", type = int, default = 20)
+    parser.add_argument("--minimum", type = int, default = 1)
+    parser.add_argument("--maximum", type = int, default = 100)
+    parser.add_argument("--interval", type = float, default = 5, help = "seconds between autoscaler ticks")
+    parser.add_argument("--setup", type = float, default = 15, help = "seconds to copy and configure a server")
+    parser.add_argument("--boot", type = float, default = 45, help = "seconds from boot to 0x01")
+    parser.add_argument("--stop", type = float, default = 10)
+    parser.add_argument("--static", type = int, help = "compare against this many always-on servers instead of autoscaling")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = loadTrace(args.trace)
+    elif args.snapshot:
+        trace = snapshotTrace(args.snapshot, args.type, args.width)
+    else:
+        trace = synthetic(args.synthetic, args.peak, args.seed)
+    times = [t for t, p in trace]
+
+    if args.static:
+        policy = autoscale.Policy(headroom = 0, band = 10 ** 9, minimum = args.static, maximum = args.static, slots = args.slots, lead = 0)
+        args.setup = args.boot = 0
+    else:
+        policy = autoscale.Policy(args.headroom, args.band, args.idle, args.lead, args.minimum, args.maximum, slots = args.slots)
+    sim = Simulation(args.type, policy, args.setup, args.boot, args.stop)
+    sim.scaler.LOG.info = lambda message: None
+
+    step = 1.0
+    demand = 0.0
+    nextTick = 0.0
+    while sim.now < times[-1]:
+        if sim.now >= nextTick:
+            sim.scaler.tick()
+            nextTick += args.interval
+        sim.advance(step)
+        target = playersAt(trace, times, sim.now)
+        demand += target * step
+        sim.seat(target, step)
+
+    events = sim.scaler.events
+    print(f"trace: {len(trace)} points over {times[-1] / 3600:.1f}h, peak {max(p for t, p in trace):.0f} players")
+    print("policy: " + (f"static {args.static}" if args.static else f"headroom={args.headroom} band={args.band} idle={args.idle:g}s lead={args.lead:g}s"))
+    print(f"server hours: {sim.serverSeconds / 3600:.1f} (peak {sim.peak} servers, {sim.count} created)")
+    print(f"rejected: {sim.rejected / 60:.0f} player-minutes ({sim.rejected / max(demand, 1) * 100:.2f}% of demand)")
+    print(f"scale events: {sum(1 for i in events if i[2] == 'up')} up, {sum(1 for i in events if i[2] == 'drain')} drains, {sum(1 for i in events if i[2] == 'retire')} retired")
+
+
+if __name__ == "__main__":
+    main()
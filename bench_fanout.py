@@ -0,0 +1,143 @@
+"""
+Delivery benchmark for cross-server broadcasts.
+
+Starts a listener with a fake fleet and publishes type broadcasts (0xec) at it.
+Receivers either poll with 0xf0 heartbeats every --interval seconds, or hold a
+framed connection attached with 0xee and get messages pushed. Reports delivery
+latency and how many packets carried them.
+
+    python bench_fanout.py --receive poll --interval 1
+    python bench_fanout.py --receive push --servers 50 --messages 500
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import bench_proxy
+import proxy
+import rsglobal
+
+
+def broadcast(source, typ, message):
+    pack = proxy.OutPacket(0xec)
+    pack.writeByte(1)
+    pack.writeString(source.id)
+    pack.writeByte(1)
+    pack.writeString(typ)
+    pack.writeString(message)
+    return bytes(pack.data)
+
+
+def attach(server):
+    pack = proxy.OutPacket(0xee)
+    pack.writeString(server.fullId)
+    return bytes(pack.data)
+
+
+def count(payload):
+    """(packets, messages) in an OutPacketGroup payload"""
+    reader = proxy.Reader(payload)
+    packets = reader.readShort()
+    messages = 0
+    for n in range(packets):
+        size = reader.readShort()
+        data = proxy.Reader(bytes(reader.view[reader.pointer:reader.pointer + size]))
+        reader.pointer += size
+        if data.readByte() == 0xed:
+            messages += data.readShort()
+    return packets, messages
+
+
+async def framed(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(bytes([proxy.Framing.HELLO, proxy.Framing.VERSION]))
+    await writer.drain()
+    await reader.readexactly(1)
+    return reader, writer
+
+
+async def request(reader, writer, seq, data):
+    writer.write(proxy.Framing.frame(seq, data))
+    await writer.drain()
+    while True:
+        size, got = proxy.Framing.HEADER.unpack(await reader.readexactly(proxy.Framing.HEADER.size))
+        payload = await reader.readexactly(size)
+        if got == seq:
+            return payload
+
+
+async def pusher(port, server, expected, received):
+    reader, writer = await framed(port)
+    await request(reader, writer, 1, attach(server))
+    while received[server.fullId][1] < expected:
+        size, seq = proxy.Framing.HEADER.unpack(await reader.readexactly(proxy.Framing.HEADER.size))
+        packets, messages = count(await reader.readexactly(size))
+        received[server.fullId][0] += packets
+        received[server.fullId][1] += messages
+    writer.close()
+
+
+async def poller(port, server, expected, received, interval):
+    reader, writer = await framed(port)
+    seq = 0
+    while received[server.fullId][1] < expected:
+        await asyncio.sleep(interval)
+        seq = (seq + 1) % proxy.Framing.PUSH
+        packets, messages = count(await request(reader, writer, seq, bench_proxy.heartbeat(server)))
+        received[server.fullId][0] += packets
+        received[server.fullId][1] += messages
+    writer.close()
+
+
+async def publisher(port, source, messages, rate):
+    reader, writer = await framed(port)
+    for n in range(messages):
+        await request(reader, writer, n + 1, broadcast(source, "bench", "message %d" % n))
+        await asyncio.sleep(1 / rate)
+    writer.close()
+
+
+async def run(port, fleet, source, args):
+    received = {i.fullId: [0, 0] for i in fleet}
+    if args.receive == "push":
+        receivers = [pusher(port, i, args.messages, received) for i in fleet]
+    else:
+        receivers = [poller(port, i, args.messages, received, args.interval) for i in fleet]
+    tasks = [asyncio.ensure_future(i) for i in receivers]
+    await asyncio.sleep(0.2)
+    await publisher(port, source, args.messages, args.rate)
+    await asyncio.wait_for(asyncio.gather(*tasks), 30)
+    return received
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Broadcast fan-out benchmark")
+    parser.add_argument("--receive", choices = ["poll", "push"], default = "push")
+    parser.add_argument("--servers", type = int, default = 20)
+    parser.add_argument("--messages", type = int, default = 200)
+    parser.add_argument("--rate", type = float, default = 500, help = "messages published per second")
+    parser.add_argument("--interval", type = float, default = 1, help = "heartbeat interval when polling")
+    args = parser.parse_args()
+
+    fleet = rsglobal.ServerRegistry()
+    for i in range(args.servers):
+        fleet.append(rsglobal.DynamicServer("standard-1.8.8", "S", sid = "f%03d" % i, type = "bench", handleFile = False))
+    source = rsglobal.DynamicServer("standard-1.8.8", "S", sid = "src", type = "lobby", handleFile = False)
+    listener = proxy.AsyncProxyListener([], fleet, [], rsglobal.BungeeServer(), port = 0, autostart = False)
+    threading.Thread(target = listener.listen, daemon = True).start()
+    listener.ready.wait()
+
+    start = time.perf_counter()
+    received = asyncio.run(run(listener.port, list(fleet), source, args))
+    elapsed = time.perf_counter() - start
+
+    hist = listener.fanout.latency
+    packets = sum(i[0] for i in received.values())
+    print(f"receive={args.receive} servers={args.servers} messages={args.messages} delivered={hist.total} in {elapsed:.2f}s")
+    print(f"packets: {packets} ({hist.total / max(packets, 1):.1f} messages per packet)")
+    print(f"latency: mean={hist.mean * 1000:.2f}ms p50<={hist.percentile(0.5) * 1000:g}ms p99<={hist.percentile(0.99) * 1000:g}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark player placement: one 0xe5 query against the full 0xe2 list.
+
+Builds a fake fleet of running servers, some of them hot (low TPS or near
+their heap limit), and routes --joins players through the listener. Each
+player either asks 0xe5 for a target, or fetches the 0xe2 list and picks the
+emptiest server the way the Bungee plugin would. Joined players only reach
+the monitor through the 0xf0 pings servers send in between, and a player
+sent to a full server is turned away. Reports time per request, response
+size, and where the players ended up.
+
+    python bench_placement.py --servers 1000 --joins 5000
+    python bench_placement.py --servers 200 --policy binpack --hot 0.2
+"""
+import argparse
+import random
+import time
+
+import placement
+import proxy
+import rsglobal
+
+
+def heartbeat(server, players):
+    pack = proxy.OutPacket(0xf0)
+    pack.writeByte(1)
+    pack.writeString(server.id)
+    pack.writeString(server.name)
+    pack.writeString(str(server.tps))
+    pack.writeLong(server.ramused)
+    pack.writeTypeArray(players)
+    return bytes(pack.data)
+
+
+def place(typ, policy):
+    pack = proxy.OutPacket(0xe5)
+    pack.writeString("bench")
+    pack.writeString(typ)
+    pack.writeByte(policy)
+    return bytes(pack.data)
+
+
+def serverList():
+    pack = proxy.OutPacket(0xe2)
+    pack.writeString("bench")
+    return bytes(pack.data)
+
+
+def packets(payload):
+    reader = proxy.Reader(payload)
+    out = []
+    for n in range(reader.readShort()):
+        size = reader.readShort()
+        out.append(proxy.Reader(bytes(reader.view[reader.pointer:reader.pointer + size])))
+        reader.pointer += size
+    return out
+
+
+def fromPlace(payload):
+    reader = packets(payload)[0]
+    reader.readByte()
+    reader.readString()
+    return reader.readString() or None
+
+
+def fromList(payload, typ):
+    """Pick the emptiest server of typ out of a 0xe4 reply, as a client walking the list would"""
+    reader = packets(payload)[0]
+    reader.readByte()
+    reader.readString()
+    best, most = None, 0
+    for n in range(reader.readShort()):
+        fullId, _, players, maxplayers, svtype = reader.readString(), reader.readString(), reader.readShort(), reader.readShort(), reader.readString()
+        if svtype == typ and maxplayers - players > most:
+            best, most = fullId, maxplayers - players
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Player placement benchmark")
+    parser.add_argument("--servers", type = int, default = 1000)
+    parser.add_argument("--joins", type = int, default = 5000)
+    parser.add_argument("--slots", type = int, default = 20)
+    parser.add_argument("--hot", type = float, default = 0.1, help = "share of servers with low TPS or a nearly full heap")
+    parser.add_argument("--policy", choices = ["spread", "binpack"], default = "spread")
+    parser.add_argument("--ping-every", type = int, default = 10, help = "joins between each round of 0xf0 pings")
+    parser.add_argument("--seed", type = int, default = 1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fleet = rsglobal.ServerRegistry()
+    hot = set()
+    for n in range(args.servers):
+        server = rsglobal.DynamicServer("standard-1.8.8", "S", sid = "p%04d" % n, type = "bench", maxplayers = args.slots, handleFile = False)
+        server.tps = 19.5 + rng.random() / 2
+        server.ramused = rng.randint(300, 700)
+        if rng.random() < args.hot:
+            if rng.random() < 0.5:
+                server.tps = rng.uniform(8, 14)
+            else:
+                server.ramused = rng.randint(950, 1020)
+            hot.add(server.fullId)
+        fleet.append(server)
+        server.status = rsglobal.SERVER_STATUS.RUNNING
+    listener = proxy.ProxyListener([], fleet, [], rsglobal.BungeeServer(), port = 0, autostart = False, profile = False)
+    policy = {v: k for k, v in placement.POLICIES.items()}[args.policy]
+
+    for mode in ("0xe5", "0xe2"):
+        online = {i.fullId: [] for i in fleet}
+        for server in fleet:
+            listener.handle(heartbeat(server, []))
+        request = place("bench", policy) if mode == "0xe5" else serverList()
+        if not packets(listener.handle(request)):
+            print(f"{mode}: reply does not fit in one packet at {args.servers} servers")
+            continue
+        elapsed = 0.0
+        size = 0
+        onHot = 0
+        rejected = 0
+        servers = list(fleet)
+        for n in range(args.joins):
+            start = time.perf_counter()
+            payload = listener.handle(request)
+            fullId = fromPlace(payload) if mode == "0xe5" else fromList(payload, "bench")
+            elapsed += time.perf_counter() - start
+            size += len(payload)
+            if fullId is None or len(online[fullId]) >= args.slots:
+                rejected += 1
+            else:
+                online[fullId].append("player" + str(n))
+                onHot += fullId in hot
+            if n % args.ping_every == 0:
+                for server in rng.sample(servers, min(len(servers), 50)):
+                    listener.handle(heartbeat(server, online[server.fullId]))
+        used = [len(i) for i in online.values() if i]
+        print(f"{mode}: {elapsed / args.joins * 1e6:.1f}us per join, {size / args.joins:.0f} bytes per reply, "
+              f"{onHot} players on hot servers, {rejected} turned away, {len(used)} servers used, max {max(used, default = 0)} players on one")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark server provisioning time against template size.
+
+Builds synthetic templates (jars plus world region files) of growing size in a
+scratch directory and provisions copies of each with a plain copytree and with
+actions.provisionTree, or measures a real template with --template.
+
+    python bench_provision.py --sizes 16 64 256 --copies 5
+    python bench_provision.py --template templates/standard-1.19.2/world
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import actions
+
+
+def makeTemplate(path, megabytes, jarShare):
+    chunk = os.urandom(1048576)
+    jars = int(megabytes * jarShare)
+    os.makedirs(os.path.join(path, "bundler", "libraries"))
+    os.makedirs(os.path.join(path, "world", "region"))
+    for i in range(jars):
+        with open(os.path.join(path, "bundler", "libraries", "lib-" + str(i) + ".jar"), "wb") as f:
+            f.write(chunk)
+    for i in range(megabytes - jars):
+        with open(os.path.join(path, "world", "region", "r." + str(i) + ".0.mca"), "wb") as f:
+            f.write(chunk)
+    with open(os.path.join(path, "server.properties"), "w") as f:
+        f.write("server-port=25565\n")
+
+
+def measure(template, scratch, copies, link):
+    elapsed = 0
+    stats = {}
+    for n in range(copies):
+        dst = os.path.join(scratch, ("link-" if link else "copy-") + str(n))
+        start = time.perf_counter()
+        if link is None:
+            shutil.copytree(template, dst)
+        else:
+            stats = actions.provisionTree(template, dst, link)
+        elapsed += time.perf_counter() - start
+        shutil.rmtree(dst)
+    return elapsed / copies, stats
+
+
+def report(label, template, scratch, copies):
+    copy, _ = measure(template, scratch, copies, None)
+    link, stats = measure(template, scratch, copies, True)
+    print(f"{label:<12} copytree={copy * 1000:8.1f}ms provision={link * 1000:8.1f}ms speedup={copy / link:5.1f}x "
+          f"linked={stats['linked']} reflinked={stats['reflinked']} copied={stats['copied']} bytesCopied={stats['bytesCopied'] // 1024}KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Server provisioning benchmark")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [16, 64, 256], help = "synthetic template sizes in MB")
+    parser.add_argument("--jars", type = float, default = 0.8, help = "share of the template that is jars")
+    parser.add_argument("--copies", type = int, default = 3)
+    parser.add_argument("--template", help = "measure this template directory instead")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir = ".") as scratch:
+        if args.template:
+            report(os.path.basename(os.path.normpath(args.template)), args.template, scratch, args.copies)
+            return
+        for size in args.sizes:
+            template = os.path.join(scratch, "template-" + str(size))
+            makeTemplate(template, size, args.jars)
+            report(str(size) + "MB", template, scratch, args.copies)
+            shutil.rmtree(template)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Load benchmark for the proxy listener.
+
+Starts a listener on a free port with a fake fleet, then fires concurrent 0xf0
+heartbeats at it and reports pings per second and latency percentiles.
+
+    python bench_proxy.py --mode async --servers 200 --clients 500 --pings 20
+    python bench_proxy.py --mode blocking --stalled 4 --stall 0.5
+    python bench_proxy.py --mode async --framed
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import proxy
+import rsglobal
+
+
+def heartbeat(server):
+    pack = proxy.OutPacket(0xf0)
+    pack.writeByte(1)
+    pack.writeString(server.id)
+    pack.writeString(server.name)
+    pack.writeString("20.0")
+    pack.writeLong(512)
+    pack.writeByte(0)
+    pack.writeShort(0)
+    return bytes(pack.data)
+
+
+async def client(port, packets, pings, latencies, stall = 0):
+    for n in range(pings):
+        data = packets[n % len(packets)]
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        if stall:
+            await asyncio.sleep(stall)
+            start = time.perf_counter()
+        writer.write(data)
+        await writer.drain()
+        await reader.read(1024)
+        writer.close()
+        latencies.append(time.perf_counter() - start)
+
+
+async def framedClient(port, packets, pings, latencies, stall = 0):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(bytes([proxy.Framing.HELLO, proxy.Framing.VERSION]))
+    await writer.drain()
+    if (await reader.readexactly(1))[0] != proxy.Framing.VERSION:
+        raise RuntimeError("Listener refused framed mode")
+    if stall:
+        await asyncio.sleep(stall)
+    for n in range(pings):
+        start = time.perf_counter()
+        writer.write(proxy.Framing.frame(n % proxy.Framing.PUSH, packets[n % len(packets)]))
+        await writer.drain()
+        size, seq = proxy.Framing.HEADER.unpack(await reader.readexactly(proxy.Framing.HEADER.size))
+        await reader.readexactly(size)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def run(port, packets, clients, pings, stalled, stall, framed):
+    latencies = []
+    start = time.perf_counter()
+    c = framedClient if framed else client
+    slow = [c(port, packets, 1, [], stall) for n in range(stalled)]
+    await asyncio.gather(*slow, *[c(port, packets[n::clients] or packets, pings, latencies) for n in range(clients)])
+    return time.perf_counter() - start, latencies
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Proxy listener load benchmark")
+    parser.add_argument("--mode", choices = ["async", "blocking"], default = "async")
+    parser.add_argument("--servers", type = int, default = 200)
+    parser.add_argument("--clients", type = int, default = 200)
+    parser.add_argument("--pings", type = int, default = 20)
+    parser.add_argument("--stalled", type = int, default = 0, help = "connections that hold the socket open before sending")
+    parser.add_argument("--stall", type = float, default = 0.5, help = "seconds each stalled connection waits")
+    parser.add_argument("--framed", action = "store_true", help = "keep one framed connection per client (async mode only)")
+    args = parser.parse_args()
+
+    fleet = rsglobal.ServerRegistry()
+    for i in range(args.servers):
+        fleet.append(rsglobal.DynamicServer("standard-1.8.8", "S", sid = "b%03d" % i, type = "bench", handleFile = False))
+    listener = (proxy.AsyncProxyListener if args.mode == "async" else proxy.ProxyListener)([], fleet, [], rsglobal.BungeeServer(), port = 0, autostart = False)
+    threading.Thread(target = listener.listen, daemon = True).start()
+    listener.ready.wait()
+
+    packets = [heartbeat(i) for i in fleet]
+    elapsed, latencies = asyncio.run(run(listener.port, packets, args.clients, args.pings, args.stalled, args.stall, args.framed))
+
+    print(f"mode={args.mode} servers={args.servers} clients={args.clients} stalled={args.stalled} framed={args.framed} pings={len(latencies)}")
+    print(f"throughput: {len(latencies) / elapsed:.0f} pings/s")
+    print(f"latency: p50={percentile(latencies, 50) * 1000:.2f}ms p99={percentile(latencies, 99) * 1000:.2f}ms max={max(latencies) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
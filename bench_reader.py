@@ -0,0 +1,141 @@
+"""
+Microbenchmark for proxy.Reader on realistic 0xf0 heartbeats.
+
+Decodes the same player-list packets with the current Reader and with the
+byte-by-byte LegacyReader it replaced, and checks both agree.
+
+    python bench_reader.py --players 100 --rounds 2000
+"""
+import argparse
+import time
+import uuid
+
+import proxy
+
+
+class LegacyReader:
+
+    def __init__(self, data=b""):
+        self.data = data
+        self.pointer = 0
+
+    def readByte(self):
+        x = self.data[self.pointer]
+        self.pointer += 1
+        if isinstance(x, int):
+            return x
+        return ord(x)
+
+    def readShort(self):
+        n = 0
+        for i in range(2):
+            n += self.readByte() * 256 ** i
+        return n
+
+    def readSignedShort(self):
+        return self.readShort() - 32768
+
+    def readInteger(self):
+        n = 0
+        for i in range(4):
+            n += self.readByte() * 256 ** i
+        return n
+
+    def readSignedInteger(self):
+        return self.readInteger() - 2147483648
+
+    def readLong(self):
+        n = 0
+        for i in range(8):
+            n += self.readByte() * 256 ** i
+        return n
+
+    def readString(self):
+        size = self.readShort()
+        x = ""
+        for i in range(size):
+            x += chr(self.readByte())
+        return x
+
+    def readBoolean(self):
+        if self.readByte():
+            return True
+        return False
+
+    def readTypeArray(self):
+        typ_i = self.readByte()
+        typ = self.types[typ_i]
+        size = self.readShort()
+        arr = []
+        for i in range(size):
+            arr.append(typ(self))
+        return arr
+
+    def readMixedArray(self):
+        size = self.readShort()
+        arr = []
+        for i in range(size):
+            typ_i = self.readByte()
+            typ = self.types[typ_i]
+            arr.append(typ(self))
+        return arr
+
+    types = {
+        0: readByte,
+        1: readShort,
+        2: readSignedShort,
+        3: readInteger,
+        4: readSignedInteger,
+        5: readString,
+        6: readTypeArray,
+        7: readMixedArray,
+        8: readBoolean
+    }
+
+
+def heartbeat(players):
+    pack = proxy.OutPacket(0xf0)
+    pack.writeByte(1)
+    pack.writeString("b001")
+    pack.writeString("S_b001_standard-1.8.8_bench:lobby")
+    pack.writeString("19.97")
+    pack.writeLong(734003200)
+    pack.writeTypeArray([["Player" + str(n), n % 300, str(uuid.uuid4()), n % 7 == 0] for n in range(players)])
+    return bytes(pack.data)
+
+
+def decode(cls, data):
+    packet = cls(data)
+    packet.readByte()
+    packet.readByte()
+    packet.readString()
+    packet.readString()
+    float(packet.readString())
+    packet.readLong()
+    return packet.readTypeArray()
+
+
+def measure(cls, data, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        decode(cls, data)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "proxy.Reader decoding microbenchmark")
+    parser.add_argument("--players", type = int, nargs = "+", default = [0, 20, 100, 500])
+    parser.add_argument("--rounds", type = int, default = 2000)
+    args = parser.parse_args()
+
+    for players in args.players:
+        data = heartbeat(players)
+        if decode(proxy.Reader, data) != decode(LegacyReader, data):
+            raise AssertionError("Reader and LegacyReader disagree on a " + str(players) + " player packet")
+        old = measure(LegacyReader, data, args.rounds)
+        new = measure(proxy.Reader, data, args.rounds)
+        print(f"players={players:<4} bytes={len(data):<6} legacy={old * 1e6:9.1f}us reader={new * 1e6:8.1f}us speedup={old / new:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark 0xe2 server-list requests against the cached snapshot.
+
+Builds a fake fleet, then runs rounds in which --churn servers report a new
+player count over 0xf0 and BungeeCord asks for the list --polls times: as a
+full 0xe2, as a 0xe7 delta against the generation it saw last, and encoded
+from scratch per request (the pre-snapshot handler) for comparison.
+
+    python bench_serverlist.py --servers 1000 --churn 10 --polls 5
+    python bench_serverlist.py --servers 200 --churn 0
+"""
+import argparse
+import random
+import time
+
+import proxy
+import rsglobal
+
+
+def heartbeat(server, players):
+    pack = proxy.OutPacket(0xf0)
+    pack.writeByte(1)
+    pack.writeString(server.id)
+    pack.writeString(server.name)
+    pack.writeString("20.0")
+    pack.writeLong(512)
+    pack.writeTypeArray(players)
+    return bytes(pack.data)
+
+
+def serverList():
+    pack = proxy.OutPacket(0xe2)
+    pack.writeString("bench")
+    return bytes(pack.data)
+
+
+def delta(generation):
+    pack = proxy.OutPacket(0xe7)
+    pack.writeString("bench")
+    pack.writeLong(generation)
+    return bytes(pack.data)
+
+
+def generationOf(payload):
+    reader = proxy.Reader(payload)
+    reader.readShort()
+    reader.readShort()
+    reader.readByte()
+    reader.readString()
+    return reader.readLong()
+
+
+def uncached(registry):
+    """The list as 0xe2 built it before snapshots: every row, every request"""
+    al = []
+    for i in registry:
+        if i.pooled or i.draining:
+            continue
+        al.append([i.fullId, len(i.players), i.maxplayers, i.type, i.name])
+    ot = proxy.OutPacket(0xe4)
+    ot.writeString("bench")
+    ot.writeShort(len(al))
+    for i in al:
+        ot.writeString(i[0])
+        ot.writeString(i[4])
+        ot.writeShort(i[1])
+        ot.writeShort(i[2])
+        ot.writeString(i[3])
+    return proxy.OutPacketGroup([ot]).data
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Server-list snapshot benchmark")
+    parser.add_argument("--servers", type = int, default = 1000)
+    parser.add_argument("--rounds", type = int, default = 200)
+    parser.add_argument("--churn", type = int, default = 10, help = "servers whose player count changes per round")
+    parser.add_argument("--polls", type = int, default = 5, help = "list requests per round")
+    parser.add_argument("--seed", type = int, default = 1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fleet = rsglobal.ServerRegistry()
+    for n in range(args.servers):
+        server = rsglobal.DynamicServer("standard-1.8.8", "S", sid = "l%04d" % n, type = "bench", handleFile = False)
+        server.name = "bench-" + server.fullId
+        fleet.append(server)
+    listener = proxy.ProxyListener([], fleet, [], rsglobal.BungeeServer(), port = 0, autostart = False, profile = False)
+    servers = list(fleet)
+    full = serverList()
+    generation = generationOf(listener.handle(delta(0)))
+
+    times = {"0xe2": 0.0, "0xe7": 0.0, "uncached": 0.0}
+    sizes = {"0xe2": 0, "0xe7": 0, "uncached": 0}
+    builds = listener.snapshot.builds
+    for n in range(args.rounds):
+        for server in rng.sample(servers, args.churn):
+            listener.handle(heartbeat(server, ["p"] * rng.randint(0, 20)))
+        for m in range(args.polls):
+            start = time.perf_counter()
+            payload = listener.handle(full)
+            times["0xe2"] += time.perf_counter() - start
+            sizes["0xe2"] += len(payload)
+
+            start = time.perf_counter()
+            payload = listener.handle(delta(generation))
+            times["0xe7"] += time.perf_counter() - start
+            sizes["0xe7"] += len(payload)
+            generation = generationOf(payload)
+
+            start = time.perf_counter()
+            payload = uncached(fleet)
+            times["uncached"] += time.perf_counter() - start
+            sizes["uncached"] += len(payload)
+
+    requests = args.rounds * args.polls
+    print(f"servers={args.servers} churn={args.churn}/round polls={args.polls}/round rebuilds={listener.snapshot.builds - builds}")
+    for mode in times:
+        print(f"{mode}: {times[mode] / requests * 1e6:.1f}us per request, {sizes[mode] / requests:.0f} bytes per reply")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import collections
+import os
+import threading
+
+import logger
+import propertyreader
+
+TEMPLATE_DIR = "templates"
+WORLD_DIR = "_worlds"
+
+class Template:
+
+    def __init__(self, name, path, mtime, source):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.source = source
+        self.properties = collections.OrderedDict((i.key, i.value) for i in source.properties)
+
+    def __repr__(self):
+        return f"Template({self.name}, {len(self.properties)} properties)"
+
+class TemplateCatalog:
+    """
+    Every server template under templates/ with its server.properties parsed
+    once, comments kept, and its values exposed as an ordered dict. Entries are re-parsed only when the file's mtime
+    changes, so creating a server costs a stat and one buffered write.
+    """
+
+    def __init__(self, root = TEMPLATE_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self.templates = {}
+        self.worlds = []
+        self.LOG = logger.Logger(self)
+        self.scan()
+
+    def scan(self):
+        with self.lock:
+            self.templates = {}
+            for name in sorted(os.listdir(self.root)):
+                if name == WORLD_DIR:
+                    continue
+                path = os.path.join(self.root, name, "server.properties")
+                if os.path.isfile(path):
+                    self.templates[name] = self._load(name, path)
+            worlds = os.path.join(self.root, WORLD_DIR)
+            self.worlds = sorted(os.listdir(worlds)) if os.path.isdir(worlds) else []
+        self.LOG.info(f"Cataloged {len(self.templates)} template(s) and {len(self.worlds)} world(s)")
+
+    def names(self):
+        return list(self.templates)
+
+    def get(self, name: str) -> Template:
+        with self.lock:
+            template = self.templates.get(name)
+            if template is None:
+                path = os.path.join(self.root, name, "server.properties")
+                if not os.path.isfile(path):
+                    raise KeyError("No such template: " + name)
+            else:
+                path = template.path
+                if os.stat(path).st_mtime_ns == template.mtime:
+                    return template
+            template = self._load(name, path)
+            self.templates[name] = template
+            return template
+
+    def render(self, name: str, path: str, overrides: dict):
+        text = self.get(name).source.render(overrides)
+        with open(path, "w") as f:
+            f.write(text)
+
+    def _load(self, name, path):
+        mtime = os.stat(path).st_mtime_ns
+        return Template(name, path, mtime, propertyreader.PropertyFile(path))
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+def templates() -> TemplateCatalog:
+    global _CATALOG
+    with _CATALOG_LOCK:
+        if _CATALOG is None:
+            _CATALOG = TemplateCatalog()
+        return _CATALOG
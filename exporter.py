@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+import logger
+
+class MetricsExporter:
+    """
+    Serves GET /metrics in the Prometheus text format from its own thread and
+    event loop, so scrapes never wait on (or hold up) the proxy listener. The
+    page is rendered at most once per `interval` seconds however often it is
+    scraped, and servers are rendered `chunk` at a time with a sleep(0) in
+    between, which hands the GIL back to the listener thread.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry, listener = None, **kwargs):
+        self.host = kwargs.get("host", "127.0.0.1")
+        self.port = kwargs.get("port", 9127)
+        self.interval = kwargs.get("interval", 1)
+        self.chunk = kwargs.get("chunk", 200)
+        self.timeout = kwargs.get("timeout", 5)
+        self.registry = registry
+        self.listener = listener
+        self.page = b""
+        self.rendered = 0
+        self.renders = 0
+        self.ready = threading.Event()
+        self.thread = None
+        self.LOG = logger.Logger(self)
+
+    def start(self):
+        self.thread = threading.Thread(target = lambda: asyncio.run(self.serve()), daemon = True)
+        self.thread.start()
+
+    async def serve(self):
+        self.renderLock = asyncio.Lock()
+        self.server = await asyncio.start_server(self.accept, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.LOG.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        self.ready.set()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def accept(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.timeout)
+            method, path = (head.split(b"\r\n", 1)[0].split(b" ") + [b"", b""])[:2]
+            if method != b"GET":
+                self.respond(writer, "405 Method Not Allowed", b"")
+            elif path.split(b"?")[0] != b"/metrics":
+                self.respond(writer, "404 Not Found", b"")
+            else:
+                self.respond(writer, "200 OK", await self.body())
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, writer, status, body):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {self.CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        writer.write(body)
+
+    async def body(self):
+        async with self.renderLock:
+            if time.monotonic() - self.rendered >= self.interval:
+                self.page = (await self.render()).encode("utf-8")
+                self.rendered = time.monotonic()
+                self.renders += 1
+            return self.page
+
+    async def render(self):
+        out = []
+        servers = list(self.registry)
+        now = time.time()
+        metric(out, "rs_servers", "gauge", "Servers in the server list")
+        out.append(f"rs_servers {len(servers)}")
+        for name, kind, doc, value in self.SERVER_METRICS:
+            metric(out, name, kind, doc)
+            for n in range(0, len(servers), self.chunk):
+                for i in servers[n:n + self.chunk]:
+                    out.append(f'{name}{{id="{label(i.fullId)}",type="{label(i.type)}",status="{label(i.status)}"}} {value(i, now)}')
+                await asyncio.sleep(0)
+                time.sleep(0)
+        if self.listener is not None:
+            self.proxyMetrics(out)
+        out.append("")
+        return "\n".join(out)
+
+    SERVER_METRICS = (
+        ("rs_server_tps", "gauge", "Ticks per second from the last 0xf0 ping", lambda i, now: float(i.tps)),
+        ("rs_server_ram_megabytes", "gauge", "RAM in use from the last 0xf0 ping", lambda i, now: i.ramused),
+        ("rs_server_players", "gauge", "Players online", lambda i, now: len(i.players)),
+        ("rs_server_max_players", "gauge", "Player slots", lambda i, now: i.maxplayers),
+        ("rs_server_ping_age_seconds", "gauge", "Seconds since the last 0xf0 ping", lambda i, now: round(now - i.lastping, 3)),
+    )
+
+    def proxyMetrics(self, out):
+        listener = self.listener
+        opcodes = listener.profile.snapshot()
+        for name, attr, doc in (("rs_proxy_packets_total", "calls", "Packets handled by opcode"),
+                                ("rs_proxy_packet_errors_total", "errors", "Packets whose handler raised, by opcode"),
+                                ("rs_proxy_bytes_in_total", "bytesIn", "Request bytes by opcode"),
+                                ("rs_proxy_bytes_out_total", "bytesOut", "Response bytes by opcode")):
+            metric(out, name, "counter", doc)
+            for typ, stats in opcodes:
+                out.append(f'{name}{{opcode="{opcode(typ)}"}} {getattr(stats, attr)}')
+        metric(out, "rs_proxy_parse_errors_total", "counter", "Packets whose handler raised")
+        out.append(f"rs_proxy_parse_errors_total {listener.parseErrors}")
+        metric(out, "rs_proxy_handler_seconds", "histogram", "Time spent handling a packet by opcode")
+        for typ, stats in opcodes:
+            histogram(out, "rs_proxy_handler_seconds", f'opcode="{opcode(typ)}"', stats.latency)
+
+        queues = [(i.fullId, i.queued) for i in self.registry]
+        if listener.bungee is not None:
+            queues.append(("bungee", listener.bungee.queued))
+        for name, attr, kind, doc in (("rs_proxy_queue_depth", "packets", "gauge", "Packets waiting for the next poll"),
+                                      ("rs_proxy_queue_dropped_total", "dropped", "counter", "Packets dropped by queue backpressure"),
+                                      ("rs_proxy_queue_coalesced_total", "coalesced", "counter", "Idempotent packets merged into a pending one")):
+            metric(out, name, kind, doc)
+            for fullId, queue in queues:
+                value = len(queue) if attr == "packets" else getattr(queue, attr)
+                out.append(f'{name}{{id="{label(fullId)}"}} {value}')
+
+        fan = listener.fanout
+        for name, value, doc in (("rs_fanout_published_total", fan.published, "Cross-server messages published"),
+                                 ("rs_fanout_delivered_total", fan.delivered, "Message deliveries handed to a destination"),
+                                 ("rs_fanout_pushed_total", fan.pushed, "Deliveries pushed over an attached connection"),
+                                 ("rs_fanout_dropped_total", fan.dropped, "Messages dropped from a full destination"),
+                                 ("rs_fanout_rejected_total", fan.rejected, "Messages rejected as too long for one packet")):
+            metric(out, name, "counter", doc)
+            out.append(f"{name} {value}")
+        metric(out, "rs_fanout_delivery_seconds", "histogram", "Time from publish to delivery")
+        histogram(out, "rs_fanout_delivery_seconds", 'mode="push"', fan.pushLatency)
+        histogram(out, "rs_fanout_delivery_seconds", 'mode="poll"', fan.pollLatency)
+
+
+def metric(out, name, kind, doc):
+    out.append(f"# HELP {name} {doc}")
+    out.append(f"# TYPE {name} {kind}")
+
+def histogram(out, name, labels, hist):
+    buckets, total = hist.cumulative()
+    for bound, count in buckets:
+        out.append(f'{name}_bucket{{{labels},le="{"+Inf" if bound == float("inf") else bound}"}} {count}')
+    out.append(f"{name}_sum{{{labels}}} {total}")
+    out.append(f"{name}_count{{{labels}}} {buckets[-1][1]}")
+
+def label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def opcode(typ):
+    return "none" if typ is None else "0x%02x" % typ
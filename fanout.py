@@ -0,0 +1,185 @@
+import threading
+import time
+
+import logger
+import metrics
+import proxy
+
+BUNGEE = "bungee"
+
+class FanOut:
+    """
+    Pub/sub delivery for cross-server messages. A message goes to one server,
+    to every live server of a type, or to every subscriber of a topic, and is
+    parked per destination. Whatever piled up for a destination is handed over
+    as one 0xed packet (more only past the 64 KiB group entry limit): at its
+    next poll, or, when the destination holds a framed connection attached
+    with 0xee, pushed down that connection after at most `window` seconds.
+    Messages for BungeeCord keep their 0xe9 form. A message too long to fit
+    a packet on its own is rejected when published.
+    """
+
+    PACKET_SIZE = 65535
+
+    def __init__(self, registry, window = 0.005, capacity = 1024):
+        self.registry = registry
+        self.window = window
+        self.capacity = capacity
+        self.topics = {}
+        self.pending = {}
+        self.pushers = {}
+        self.cond = threading.Condition()
+        self.thread = None
+        self.published = 0
+        self.delivered = 0
+        self.pushed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.latency = metrics.LatencyHistogram()
+        self.pushLatency = metrics.LatencyHistogram()
+        self.pollLatency = metrics.LatencyHistogram()
+        self.LOG = logger.Logger(self)
+        registry.addListener(self._event)
+
+    def subscribe(self, fullId, topic):
+        with self.cond:
+            self.topics.setdefault(topic, set()).add(fullId)
+
+    def unsubscribe(self, fullId, topic):
+        with self.cond:
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(fullId)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def send(self, source, fullId, message):
+        return self._enqueue([fullId], source, "", message)
+
+    def sendBungee(self, target, message):
+        return self._enqueue([BUNGEE], target, "", message)
+
+    def publish(self, source, topic, message):
+        with self.cond:
+            destinations = [i for i in self.topics.get(topic, ()) if i != source]
+        return self._enqueue(destinations, source, topic, message)
+
+    def publishType(self, source, typ, message):
+        destinations = [i.fullId for i in self.registry.getByType(typ) if not i.pooled and i.fullId != source]
+        return self._enqueue(destinations, source, "type:" + typ, message)
+
+    def collect(self, destination):
+        """Everything parked for a destination, packed for its poll response"""
+        with self.cond:
+            entries = self.pending.pop(destination, None)
+        if not entries:
+            return []
+        return self._pack(destination, entries, self.pollLatency)
+
+    def attach(self, destination, push):
+        """push(payload) sends an OutPacketGroup payload down an open connection"""
+        with self.cond:
+            self.pushers[destination] = push
+            if destination in self.pending:
+                self.cond.notify()
+        if self.thread is None:
+            self.start()
+
+    def detach(self, destination, push):
+        with self.cond:
+            if self.pushers.get(destination) is push:
+                del self.pushers[destination]
+
+    def depth(self, destination):
+        with self.cond:
+            return len(self.pending.get(destination, ()))
+
+    def start(self):
+        with self.cond:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not any(i in self.pushers for i in self.pending):
+                    self.cond.wait()
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        with self.cond:
+            batches = [(i, self.pending.pop(i), self.pushers[i]) for i in list(self.pending) if i in self.pushers]
+        for destination, entries, push in batches:
+            packets = self._pack(destination, entries, self.pushLatency)
+            try:
+                push(proxy.OutPacketGroup(packets).data)
+                self.pushed += len(entries)
+            except (OSError, RuntimeError):
+                self.detach(destination, push)
+                self.LOG.warn(f"Push to {destination} failed, falling back to polling")
+
+    def _enqueue(self, destinations, source, topic, message):
+        # 0xed: opcode, count, then three length-prefixed strings; 0xe9 for bungee is smaller
+        if 9 + len(source) + len(topic) + len(message) > self.PACKET_SIZE:
+            self.rejected += 1
+            self.LOG.warn(f"Rejected a {len(message)} character message from {source}: too long for one packet")
+            return 0
+        now = time.time()
+        entry = (now, source, topic, message)
+        wake = False
+        with self.cond:
+            self.published += 1
+            for i in destinations:
+                entries = self.pending.setdefault(i, [])
+                if len(entries) >= self.capacity:
+                    entries.pop(0)
+                    self.dropped += 1
+                entries.append(entry)
+                wake = wake or i in self.pushers
+            if wake:
+                self.cond.notify()
+        return len(destinations)
+
+    def _pack(self, destination, entries, histogram):
+        now = time.time()
+        for i in entries:
+            self.latency.observe(now - i[0])
+            histogram.observe(now - i[0])
+        self.delivered += len(entries)
+        if destination == BUNGEE:
+            packets = []
+            for t, target, topic, message in entries:
+                crt = proxy.OutPacket(0xe9)
+                crt.writeString(target)
+                crt.writeString(message)
+                packets.append(crt)
+            return packets
+        packets = []
+        counts = []
+        crt = None
+        for t, source, topic, message in entries:
+            size = 6 + len(source) + len(topic) + len(message)
+            if crt is None or len(crt.data) + size > self.PACKET_SIZE:
+                crt = proxy.OutPacket(0xed)
+                crt.writeShort(0)
+                packets.append(crt)
+                counts.append(0)
+            crt.writeString(source)
+            crt.writeString(topic)
+            crt.writeString(message)
+            counts[-1] += 1
+        for crt, count in zip(packets, counts):
+            proxy.OutPacket.SHORT.pack_into(crt.data, 1, count)
+        return packets
+
+    def _event(self, event, server):
+        if event != "remove":
+            return
+        with self.cond:
+            self.pending.pop(server.fullId, None)
+            self.pushers.pop(server.fullId, None)
+            for topic in list(self.topics):
+                self.unsubscribe(server.fullId, topic)
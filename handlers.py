@@ -0,0 +1,321 @@
+import datetime
+import threading
+import time
+import tkinter.messagebox as tkmsg
+
+import fanout
+import placement
+import ports
+import proxy
+import rsglobal
+
+class Handler:
+    """
+    Handles one opcode. SCHEMA lists the packet's fields after the opcode byte
+    as (name, type) pairs; they are read in order and passed to handle() as
+    positional arguments. handle() returns None for an empty response, a list
+    of OutPackets to send as a group, or ready-made bytes. Handlers that block
+    (file I/O, slow calls) set `blocking` and run on the listener's worker pool.
+    """
+
+    OPCODES = ()
+    SCHEMA = ()
+    blocking = False
+
+    def __init__(self):
+        self.readers = None
+
+    def __call__(self, listener, packet):
+        if self.readers is None:
+            self.readers = [getattr(proxy.Reader, FIELD_TYPES[typ]) if isinstance(FIELD_TYPES[typ], str) else FIELD_TYPES[typ] for name, typ in self.SCHEMA]
+        response = self.handle(listener, *[read(packet) for read in self.readers])
+        if response is None:
+            return EMPTY
+        if isinstance(response, list):
+            return proxy.OutPacketGroup(response).data
+        return response
+
+    def handle(self, listener, *fields):
+        raise NotImplementedError
+
+
+class HandlerRegistry:
+    """Opcode byte -> Handler; plugins add their own opcodes with register()"""
+
+    def __init__(self):
+        self.handlers = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, typ):
+        return typ in self.handlers
+
+    def __iter__(self):
+        return iter(sorted(self.handlers.items()))
+
+    def get(self, typ):
+        return self.handlers.get(typ)
+
+    def register(self, handler, replace = False):
+        with self.lock:
+            taken = [i for i in handler.OPCODES if i in self.handlers]
+            if taken and not replace:
+                raise ValueError("Opcode " + ", ".join("0x%02x" % i for i in taken) + " already has a handler")
+            handlers = dict(self.handlers)
+            for i in handler.OPCODES:
+                handlers[i] = handler
+            self.handlers = handlers
+        return handler
+
+    def unregister(self, typ):
+        with self.lock:
+            handlers = dict(self.handlers)
+            handlers.pop(typ, None)
+            self.handlers = handlers
+
+
+def _decimal(packet):
+    return float(packet.readString())
+
+# schema type -> Reader method name, or a function of the Reader
+FIELD_TYPES = {
+    "byte": "readByte",
+    "short": "readShort",
+    "signed_short": "readSignedShort",
+    "int": "readInteger",
+    "long": "readLong",
+    "bool": "readBoolean",
+    "string": "readString",
+    "code": "readServerCode",
+    "decimal": _decimal,
+    "array": "readTypeArray",
+    "mixed": "readMixedArray",
+}
+
+# an OutPacketGroup of nothing
+EMPTY = b"\x00\x00"
+
+
+def serverId(ram, idd):
+    return rsglobal.SERVER_RAM_BYTENUM[ram] + idd
+
+
+class Register(Handler):
+
+    OPCODES = (0x01,)
+    SCHEMA = (("ram", "byte"), ("template", "string"), ("id", "string"), ("name", "string"), ("type", "string"), ("port", "short"))
+    # the two trailing fields of the 0xe2 notice to Bungee, per server type
+    NOTICE_FIELDS = {"verify": (0x00, 0)}
+    DEFAULT_NOTICE_FIELDS = (0x00, 0)
+
+    def handle(self, listener, ram, temp, idd, name, svtype, port):
+        i = listener.server_list.getById(idd)
+        if i is not None:
+            #i.name = name
+            i.registered = True
+            if not i.pooled:
+                i.status = rsglobal.SERVER_STATUS.RUNNING
+        else:
+            srv = rsglobal.DynamicServer(temp, rsglobal.SERVER_RAM_BYTENUM[ram], sid = idd, name = name, type = svtype, handleFile = False)
+            srv.att = "Unverified: Server is created via unexsistent."
+            srv.registered = True
+            listener.server_list.append(srv)
+
+        crt = proxy.OutPacket(0xe2)
+        crt.writeByte(ram)
+        crt.writeString(idd)
+        crt.writeShort(port)
+        c, d = self.NOTICE_FIELDS.get(svtype, self.DEFAULT_NOTICE_FIELDS)
+        crt.writeByte(c)
+        crt.writeShort(d)
+        listener.bungee.queued.append(crt)
+
+
+class InternalError(Handler):
+
+    OPCODES = (0xa2,)
+    SCHEMA = (("ram", "byte"), ("id", "string"), ("message", "string"))
+
+    def handle(self, listener, ram, idd, msg):
+        threading.Thread(target=lambda: tkmsg.showerror(f"[RS-{serverId(ram, idd)}] Broadcast System", datetime.datetime.now().strftime("%H:%M:%S") + f" An internal error occured on server [RS-{serverId(ram, idd)}]:\n\n" + msg)).start()
+        return proxy.Status.OK
+
+
+class Alert(Handler):
+
+    OPCODES = (0xa0,)
+    SCHEMA = (("ram", "byte"), ("id", "string"), ("level", "byte"), ("message", "string"))
+
+    def handle(self, listener, ram, idd, t, msg):
+        m = datetime.datetime.now().strftime("%H:%M:%S") + " " + msg
+        if t == 0:
+            func = tkmsg.showinfo
+        elif t == 1:
+            func = tkmsg.showwarning
+        elif t == 2:
+            func = tkmsg.showerror
+        threading.Thread(target=lambda: func(f"[RS-{serverId(ram, idd)}] Alert", m)).start()
+
+
+class Log(Handler):
+
+    OPCODES = (0xa1,)
+    SCHEMA = (("ram", "byte"), ("id", "string"), ("level", "byte"), ("message", "string"))
+    LEVELS = {0: "INFO", 1: "WARNING"}
+
+    def handle(self, listener, ram, idd, t, msg):
+        i = listener.server_list.getById(idd)
+        if i is not None:
+            i.logs.append(time.time(), self.LEVELS.get(t, "ERROR"), msg)
+
+
+class Stopped(Handler):
+
+    OPCODES = (0xae,)
+    SCHEMA = (("ram", "byte"), ("id", "string"))
+    blocking = True
+
+    def handle(self, listener, ram, idd):
+        i = listener.server_list.getById(idd)
+        if i is not None:
+            i.status = "STOPPED"
+            listener.server_list.discard(i)
+        ports.allocator().release(serverId(ram, idd))
+
+        crt = proxy.OutPacket(0xe3)
+        crt.writeByte(ram)
+        crt.writeString(idd)
+        listener.bungee.queued.append(crt)
+
+
+class Heartbeat(Handler):
+
+    OPCODES = (0xf0,)
+    SCHEMA = (("ram", "byte"), ("id", "string"), ("name", "string"), ("tps", "decimal"), ("ram_used", "long"), ("players", "array"))
+
+    def handle(self, listener, ram, sid, nam, tps, ramuse, players):
+        i = listener.server_list.getById(sid)
+        if i is None:
+            pack = proxy.OutPacket(0xc4)
+            pack.writeString("Server Not Found!")
+            return [pack]
+        changed = nam != i.name or len(players) != len(i.players)
+        i.name = nam
+        i.players = players
+        i.ramused = ramuse
+        i.lastping = time.time()
+        i.tps = tps
+        listener.metrics.record(i, tps, ramuse, len(players), i.lastping)
+        listener.placement.update(i)
+        if changed:
+            listener.snapshot.bump(i)
+        messages = listener.fanout.collect(i.fullId)
+        return i.queued.drain() + messages
+
+
+class Message(Handler):
+
+    OPCODES = (0xe9,)
+    SCHEMA = (("from_code", "code"), ("from_id", "string"), ("to_code", "code"), ("to_id", "string"), ("message", "string"))
+
+    def handle(self, listener, a, b, c, d, e):
+        listener.fanout.sendBungee(c + d, e)
+
+
+class Subscribe(Handler):
+
+    OPCODES = (0xea,)
+    SCHEMA = (("ram", "byte"), ("id", "string"), ("topic", "string"))
+
+    def handle(self, listener, ram, idd, topic):
+        listener.fanout.subscribe(serverId(ram, idd), topic)
+
+
+class Unsubscribe(Subscribe):
+
+    OPCODES = (0xeb,)
+
+    def handle(self, listener, ram, idd, topic):
+        listener.fanout.unsubscribe(serverId(ram, idd), topic)
+
+
+class Publish(Handler):
+
+    OPCODES = (0xec,)
+    SCHEMA = (("from_code", "code"), ("from_id", "string"), ("kind", "byte"), ("target", "string"), ("message", "string"))
+
+    def handle(self, listener, a, b, kind, target, msg):
+        if kind == 0:
+            listener.fanout.publish(a + b, target, msg)
+        elif kind == 1:
+            listener.fanout.publishType(a + b, target, msg)
+        else:
+            listener.fanout.send(a + b, target, msg)
+
+
+class BungeePoll(Handler):
+
+    OPCODES = (0xe0,)
+    SCHEMA = (("players", "short"),)
+
+    def handle(self, listener, playeramt):
+        listener.bungee.playeramt = playeramt
+        messages = listener.fanout.collect(fanout.BUNGEE)
+        return listener.bungee.queued.drain() + messages
+
+
+class BungeeReady(Handler):
+
+    OPCODES = (0xe1,)
+
+    def handle(self, listener):
+        threading.Thread(target=lambda: tkmsg.showinfo("[RS-BungeeCord] Alert", "BungeeCord is ready!")).start()
+        listener.LOG.info("BungeeCord is ready!")
+
+
+class ServerList(Handler):
+
+    OPCODES = (0xe2,)
+    SCHEMA = (("name", "string"),)
+
+    def handle(self, listener, nam):
+        return listener.snapshot.full(nam)
+
+
+class ServerListDelta(Handler):
+
+    OPCODES = (0xe7,)
+    SCHEMA = (("name", "string"), ("generation", "long"))
+
+    def handle(self, listener, nam, since):
+        return listener.snapshot.delta(nam, since)
+
+
+class Place(Handler):
+    OPCODES = (0xe5,)
+    SCHEMA = (("name", "string"), ("type", "string"), ("policy", "byte"))
+
+    def handle(self, listener, nam, svtype, policy):
+        i = listener.placement.best(svtype, placement.POLICIES.get(policy))
+        ot = proxy.OutPacket(0xe6)
+        ot.writeString(nam)
+        ot.writeString("" if i is None else i.fullId)
+        return [ot]
+
+
+BUILTIN = (Register, InternalError, Alert, Log, Stopped, Heartbeat, Message, Subscribe, Unsubscribe, Publish, BungeePoll, BungeeReady, ServerList, ServerListDelta, Place)
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+def registry() -> HandlerRegistry:
+    """The shared registry every listener dispatches through, holding the built-in opcodes"""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = HandlerRegistry()
+            for i in BUILTIN:
+                _REGISTRY.register(i())
+        return _REGISTRY
+
+def register(handler, replace = False):
+    return registry().register(handler, replace)
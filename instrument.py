@@ -0,0 +1,96 @@
+import bisect
+import collections
+import json
+import threading
+import time
+
+import metrics
+
+class OpcodeStats:
+
+    __slots__ = ("calls", "errors", "bytesIn", "bytesOut", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.latency = metrics.LatencyHistogram()
+
+
+class OpcodeProfile:
+    """
+    Per-opcode call counts, wall-time histograms, bytes in/out and exception
+    counts. Every packet takes the one profile lock (the listener thread and
+    the worker pool both record) instead of each histogram's own lock.
+    """
+
+    def __init__(self):
+        self.opcodes = {}
+        self.since = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, typ, data, response, elapsed, error):
+        with self.lock:
+            stats = self.opcodes.get(typ)
+            if stats is None:
+                stats = self.opcodes[typ] = OpcodeStats()
+            stats.calls += 1
+            stats.bytesIn += len(data)
+            stats.bytesOut += len(response)
+            if error is not None:
+                stats.errors += 1
+            hist = stats.latency
+            hist.counts[bisect.bisect_left(hist.BUCKETS, elapsed)] += 1
+            hist.total += 1
+            hist.sum += elapsed
+
+    def reset(self):
+        with self.lock:
+            self.opcodes = {}
+            self.since = time.time()
+
+    def snapshot(self):
+        """(opcode, OpcodeStats) pairs ordered by opcode, unknown (empty packet) first"""
+        return sorted(self.opcodes.copy().items(), key = lambda i: -1 if i[0] is None else i[0])
+
+    def report(self):
+        """One line per opcode, slowest mean first"""
+        lines = []
+        for typ, stats in sorted(self.snapshot(), key = lambda i: -i[1].latency.mean):
+            name = "none" if typ is None else "0x%02x" % typ
+            lines.append(f"{name}: {stats.calls} calls, mean {stats.latency.mean * 1000:.3f}ms, p99 <= {stats.latency.percentile(0.99) * 1000:g}ms, "
+                         f"{stats.bytesIn} B in, {stats.bytesOut} B out, {stats.errors} errors")
+        return lines
+
+
+class SamplingTracer:
+    """
+    Keeps a trace entry for one packet in every `every` (and for every packet
+    that raised) in a bounded ring, to be written out with dump().
+    """
+
+    def __init__(self, every = 100, capacity = 10000):
+        self.every = every
+        self.seen = 0
+        self.traces = collections.deque(maxlen = capacity)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.traces)
+
+    def record(self, typ, data, response, elapsed, error):
+        self.seen += 1
+        if error is None and self.seen % self.every:
+            return
+        with self.lock:
+            self.traces.append((time.time(), typ, elapsed, len(data), len(response), None if error is None else repr(error), bytes(data[:64]).hex()))
+
+    def dump(self, path):
+        """Write the sampled traces to path as JSON lines, oldest first, and return how many"""
+        with self.lock:
+            traces = list(self.traces)
+        with open(path, "w") as f:
+            for t, typ, elapsed, size, out, error, head in traces:
+                f.write(json.dumps({"time": t, "opcode": typ, "elapsed": elapsed, "in": size, "out": out, "error": error, "head": head}) + "\n")
+        return len(traces)
@@ -0,0 +1,112 @@
+import heapq
+import itertools
+import threading
+import time
+
+import logger
+import rsglobal
+
+class LivenessMonitor:
+    """
+    Drops servers that stopped sending 0xf0 pings. Every registered server has
+    one entry in a heap keyed on the moment it would go stale; when the entry
+    comes due the server's lastping is checked again and the entry is pushed
+    back if it pinged in the meantime, so pings themselves cost nothing here.
+    Servers going stale within `batch` seconds of each other are reported to
+    onExpire together. Servers still in SETUP are never expired, and LOADING
+    ones, like pooled standbys that have not registered, get `bootTimeout`
+    from boot to start pinging.
+    """
+
+    def __init__(self, registry, timeout = rsglobal.SERVER_PING_TIMEOUT, timeouts = None, onExpire = None, batch = 0.5, bootTimeout = rsglobal.SERVER_BOOT_TIMEOUT):
+        self.registry = registry
+        self.batch = batch
+        self.timeout = timeout
+        self.bootTimeout = bootTimeout
+        self.timeouts = dict(rsglobal.SERVER_PING_TIMEOUT_BY_TYPE if timeouts is None else timeouts)
+        self.onExpire = onExpire
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.LOG = logger.Logger(self)
+        registry.addListener(self._event)
+        for i in registry:
+            self.track(i)
+
+    def timeoutFor(self, server):
+        return self.timeouts.get(server.type, self.timeout)
+
+    def setTimeout(self, typ, seconds):
+        with self.cond:
+            if seconds is None:
+                self.timeouts.pop(typ, None)
+            else:
+                self.timeouts[typ] = seconds
+            for i in self.registry.getByType(typ):
+                self._push(i)
+            self.cond.notify()
+
+    def track(self, server):
+        with self.cond:
+            self._push(server)
+            self.cond.notify()
+
+    def untrack(self, server):
+        with self.cond:
+            self.entries.pop(server.fullId, None)
+
+    def expire(self, now = None):
+        if now is None:
+            now = time.time()
+        lost = []
+        with self.cond:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, n, server = heapq.heappop(self.heap)
+                if self.entries.get(server.fullId) != n:
+                    continue
+                deadline = server.lastping + self.timeoutFor(server)
+                if server.status == rsglobal.SERVER_STATUS.SETUP:
+                    # still being copied by the provisioner, it cannot have pinged yet
+                    deadline = now + self.timeoutFor(server)
+                elif server.status == rsglobal.SERVER_STATUS.LOADING or server.pooled and not server.registered:
+                    # booted but the JVM may not be pinging yet; lastping was set at boot (standbys stay HIBERNATING meanwhile)
+                    deadline = server.lastping + max(self.timeoutFor(server), self.bootTimeout)
+                if deadline > now:
+                    self._push(server, deadline)
+                    continue
+                del self.entries[server.fullId]
+                lost.append(server)
+        lost = [i for i in lost if self.registry.discard(i)]
+        if lost:
+            self.LOG.warn("Lost track of " + ", ".join("[RS-" + i.fullId + "]" for i in lost))
+            if self.onExpire is not None:
+                self.onExpire(lost)
+        return lost
+
+    def start(self):
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.cond:
+                if self.heap:
+                    self.cond.wait(max(0, self.heap[0][0] - time.time()) + self.batch)
+                else:
+                    self.cond.wait()
+            self.expire()
+
+    def _push(self, server, deadline = None):
+        if deadline is None:
+            deadline = server.lastping + self.timeoutFor(server)
+        n = next(self.counter)
+        self.entries[server.fullId] = n
+        heapq.heappush(self.heap, (deadline, n, server))
+
+    def _event(self, event, server):
+        if event == "add":
+            self.track(server)
+        elif event == "remove":
+            self.untrack(server)
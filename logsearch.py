@@ -0,0 +1,164 @@
+"""
+Search rotated server logs (running/<id>/logs/*.log.gz) across the fleet.
+
+    python logsearch.py "Can't keep up" --type verify --since 2023-04-22T13:00 --until 2023-04-22T18:00
+"""
+import argparse
+import concurrent.futures
+import datetime
+import gzip
+import json
+import os
+import re
+
+import propertyreader
+
+RUNNING_DIR = "running"
+LINE = re.compile(r"^\[(\d\d):(\d\d):(\d\d)\] \[[^\]]*?/([A-Z]+)\]")
+TOKEN = re.compile(r"[a-z0-9_]{3,}")
+INDEX_VERSION = 2
+
+def archiveDate(path):
+    return datetime.datetime.strptime(os.path.basename(path)[:10], "%Y-%m-%d")
+
+class DayClock:
+    """
+    Turns an archive's HH:MM:SS stamps into epoch seconds, starting on the
+    date in its name and moving to the next day whenever the time of day
+    jumps back by more than 12 hours (a DST fall-back stays on the same day).
+    """
+
+    def __init__(self, date):
+        self.date = date
+        self.previous = None
+
+    def __call__(self, m):
+        seconds = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+        if self.previous is not None and seconds < self.previous - 43200:
+            self.date += datetime.timedelta(days = 1)
+        self.previous = seconds
+        return (self.date + datetime.timedelta(seconds = seconds)).timestamp()
+
+def buildIndex(path):
+    """Time range, level counts and token set of one archive, cached in a .idx sidecar next to it"""
+    sidecar = path + ".idx"
+    stat = os.stat(path)
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION and index["size"] == stat.st_size and index["mtime"] == stat.st_mtime_ns:
+            return index
+    clock = DayClock(archiveDate(path))
+    first = last = None
+    levels = {}
+    words = set()
+    with gzip.open(path, "rt", encoding = "utf-8", errors = "replace") as f:
+        for line in f:
+            m = LINE.match(line)
+            if m:
+                t = clock(m)
+                if first is None:
+                    first = t
+                last = t
+                levels[m.group(4)] = levels.get(m.group(4), 0) + 1
+            words.update(TOKEN.findall(line.lower()))
+    index = {
+        "version": INDEX_VERSION,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "first": first,
+        "last": last,
+        "levels": levels,
+        "tokens": sorted(words)
+    }
+    with open(sidecar + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(sidecar + ".tmp", sidecar)
+    return index
+
+def serverType(serverDir):
+    path = os.path.join(serverDir, "server.properties")
+    if not os.path.exists(path):
+        return None
+    return propertyreader.PropertyFile(path, lazy = True).get("type")
+
+def searchServer(serverDir, pattern, since = None, until = None, level = None, regex = False):
+    """Matching lines of one server's archives as (fullId, timestamp, level, line)"""
+    fullId = os.path.basename(serverDir)
+    needle = re.compile(pattern if regex else re.escape(pattern), re.IGNORECASE)
+    # the first and last words of a substring may be cut mid-token, so only the inner ones must appear whole
+    required = set() if regex else set(TOKEN.findall(pattern.lower())[1:-1])
+    out = []
+    for path in sorted(os.listdir(os.path.join(serverDir, "logs")) if os.path.isdir(os.path.join(serverDir, "logs")) else []):
+        if not path.endswith(".log.gz"):
+            continue
+        path = os.path.join(serverDir, "logs", path)
+        index = buildIndex(path)
+        if index["first"] is None:
+            continue
+        if since is not None and index["last"] < since:
+            continue
+        if until is not None and index["first"] > until:
+            continue
+        if level is not None and level not in index["levels"]:
+            continue
+        if required and not required.issubset(index["tokens"]):
+            continue
+        clock = DayClock(archiveDate(path))
+        with gzip.open(path, "rt", encoding = "utf-8", errors = "replace") as f:
+            for line in f:
+                m = LINE.match(line)
+                if not m:
+                    continue
+                t = clock(m)
+                if since is not None and t < since:
+                    continue
+                if until is not None and t > until:
+                    break
+                if level is not None and m.group(4) != level:
+                    continue
+                if needle.search(line):
+                    out.append((fullId, t, m.group(4), line.rstrip("\n")))
+    return out
+
+def _searchServer(args):
+    return searchServer(*args)
+
+def search(pattern, types = None, since = None, until = None, level = None, regex = False, root = RUNNING_DIR, workers = None):
+    """Lines matching pattern on servers whose type is in types, between since and until (epoch seconds), in time order"""
+    servers = []
+    for name in sorted(os.listdir(root)):
+        serverDir = os.path.join(root, name)
+        if not os.path.isdir(serverDir):
+            continue
+        if types is not None and serverType(serverDir) not in types:
+            continue
+        servers.append((serverDir, pattern, since, until, level, regex))
+    out = []
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for lines in pool.map(_searchServer, servers):
+            out.extend(lines)
+    out.sort(key = lambda i: i[1])
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description = "Search rotated server logs")
+    parser.add_argument("pattern")
+    parser.add_argument("--type", action = "append", help = "only servers of this type (repeatable)")
+    parser.add_argument("--since", type = datetime.datetime.fromisoformat)
+    parser.add_argument("--until", type = datetime.datetime.fromisoformat)
+    parser.add_argument("--level", choices = ["INFO", "WARN", "ERROR"])
+    parser.add_argument("--regex", action = "store_true")
+    parser.add_argument("--workers", type = int)
+    args = parser.parse_args()
+
+    lines = search(args.pattern, args.type,
+                   args.since.timestamp() if args.since else None,
+                   args.until.timestamp() if args.until else None,
+                   args.level, args.regex, workers = args.workers)
+    for fullId, t, level, line in lines:
+        print(f"[RS-{fullId}] {datetime.datetime.fromtimestamp(t).strftime('%Y-%m-%d')} {line}")
+    print(f"{len(lines)} line(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import array
+import bisect
+import os
+import struct
+import threading
+
+LEVELS = ("INFO", "WARNING", "ERROR")
+
+class LogStore:
+    """
+    A server's 0xa1 log lines in a fixed-size ring: times in an array of
+    doubles, levels in a bytearray and messages in a list, all preallocated.
+    When the ring is full the oldest line is appended to an on-disk segment
+    file (if one is given) instead of being kept in memory. Lines are numbered
+    from 0 across both, so page() and search() see the whole history; a sparse
+    block index over the segment and per-level posting arrays for warnings and
+    errors keep those lookups from rescanning everything.
+    """
+
+    RECORD = struct.Struct("<dBI")
+    BLOCK = 64
+
+    def __init__(self, capacity = 2048, spill = None):
+        self.capacity = capacity
+        self.times = array.array("d", bytes(8 * capacity))
+        self.levels = bytearray(capacity)
+        self.msgs = [None] * capacity
+        self.count = 0
+        self.spilled = 0
+        self.lock = threading.Lock()
+        self.postings = {1: array.array("Q"), 2: array.array("Q")}
+        self.spill = spill
+        self.segment = None
+        self.blockOffsets = array.array("Q")
+        self.blockTimes = array.array("d")
+        self.segmentSize = 0
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"LogStore({self.count} lines, {self.count - self.oldest} in memory)"
+
+    @property
+    def oldest(self):
+        # first line number still held in memory
+        return max(0, self.count - self.capacity)
+
+    @property
+    def first(self):
+        # first line number that can still be read
+        return 0 if self.spill is not None else self.oldest
+
+    def append(self, time, level, msg):
+        lvl = LEVELS.index(level) if isinstance(level, str) else level
+        with self.lock:
+            slot = self.count % self.capacity
+            if self.count >= self.capacity:
+                self._evict(slot)
+            self.times[slot] = time
+            self.levels[slot] = lvl
+            self.msgs[slot] = msg
+            if lvl in self.postings:
+                self.postings[lvl].append(self.count)
+            self.count += 1
+
+    def page(self, start, limit):
+        """Lines start .. start + limit as (number, time, level, msg), oldest first"""
+        with self.lock:
+            end = min(self.count, start + limit)
+            return self._read(max(start, self.first), end)
+
+    def tail(self, limit):
+        return self.page(self.count - limit, limit)
+
+    def search(self, level = None, since = None, until = None, limit = None):
+        with self.lock:
+            first = self.first
+            if since is not None:
+                first = max(first, self._firstAfter(since))
+            if level is not None and LEVELS.index(level) in self.postings:
+                postings = self.postings[LEVELS.index(level)]
+                numbers = postings[bisect.bisect_left(postings, first):]
+            else:
+                numbers = range(first, self.count)
+            out = []
+            for line in self._lines(numbers):
+                if since is not None and line[1] < since:
+                    continue
+                if until is not None and line[1] > until:
+                    break
+                if level is not None and line[2] != level:
+                    continue
+                out.append(line)
+                if limit is not None and len(out) >= limit:
+                    break
+            return out
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def _evict(self, slot):
+        n = self.count - self.capacity
+        self.spilled = n + 1
+        if self.spill is None:
+            return
+        if self.segment is None:
+            os.makedirs(os.path.dirname(self.spill) or ".", exist_ok = True)
+            self.segment = open(self.spill, "wb+")
+        msg = self.msgs[slot].encode("utf-8")
+        if n % self.BLOCK == 0:
+            self.blockOffsets.append(self.segmentSize)
+            self.blockTimes.append(self.times[slot])
+        self.segment.seek(self.segmentSize)
+        self.segment.write(self.RECORD.pack(self.times[slot], self.levels[slot], len(msg)) + msg)
+        self.segmentSize += self.RECORD.size + len(msg)
+
+    def _lines(self, numbers):
+        if isinstance(numbers, range):
+            for n in range(numbers.start, numbers.stop, self.BLOCK):
+                yield from self._read(n, min(numbers.stop, n + self.BLOCK))
+        else:
+            for n in numbers:
+                yield self._read(n, n + 1)[0]
+
+    def _read(self, start, end):
+        out = []
+        if start < self.oldest:
+            out.extend(self._readSegment(start, min(end, self.oldest)))
+            start = self.oldest
+        for n in range(start, end):
+            slot = n % self.capacity
+            out.append((n, self.times[slot], LEVELS[self.levels[slot]], self.msgs[slot]))
+        return out
+
+    def _readSegment(self, start, end):
+        out = []
+        if self.segment is None:
+            return out
+        block = start // self.BLOCK
+        self.segment.seek(self.blockOffsets[block])
+        n = block * self.BLOCK
+        while n < end:
+            t, lvl, size = self.RECORD.unpack(self.segment.read(self.RECORD.size))
+            msg = self.segment.read(size)
+            if n >= start:
+                out.append((n, t, LEVELS[lvl], msg.decode("utf-8")))
+            n += 1
+        return out
+
+    def _firstAfter(self, since):
+        lo, hi = self.oldest, self.count
+        if self.segment is not None and (lo == hi or self.times[lo % self.capacity] >= since):
+            block = bisect.bisect_left(self.blockTimes, since) - 1
+            return max(0, block) * self.BLOCK
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[mid % self.capacity] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
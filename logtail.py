@@ -0,0 +1,95 @@
+import collections
+import glob
+import gzip
+import os
+import threading
+import time
+
+class LogTail:
+    """
+    Follows a growing log file by byte offset so each read only touches what
+    was appended since the last one. The file is reopened per read rather than
+    held, because an open handle would stop the server from rotating it on
+    Windows. When the file shrinks or its first bytes change it was rotated;
+    the rest of the old file is then taken from the newest archive matching
+    `archives` (Minecraft gzips latest.log into logs/*.log.gz) before reading
+    the new file from the start.
+    """
+
+    HEAD = 64
+
+    def __init__(self, path, archives = None, skip = True):
+        self.path = path
+        self.archives = archives
+        self.offset = 0
+        self.head = b""
+        self.partial = b""
+        self.lock = threading.Lock()
+        if skip and os.path.exists(path):
+            self.offset = os.path.getsize(path)
+            self.head = self._head()
+
+    def read(self):
+        """Complete lines appended since the last read"""
+        with self.lock:
+            data = b""
+            if not os.path.exists(self.path):
+                return []
+            size = os.path.getsize(self.path)
+            if size < self.offset or (self.offset and self._head()[:len(self.head)] != self.head):
+                data += self._rotated()
+                self.offset = 0
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data += f.read()
+                self.offset = f.tell()
+            if not self.head or len(self.head) < self.HEAD:
+                self.head = self._head()
+            data = self.partial + data
+            lines = data.split(b"\n")
+            self.partial = lines.pop()
+            return [i.decode("utf-8", "replace").rstrip("\r") + "\n" for i in lines]
+
+    def waitFor(self, timeout = 2.0, quiet = 0.2):
+        """Lines written until output has been quiet for `quiet` seconds, or `timeout` runs out"""
+        lines = []
+        end = time.time() + timeout
+        last = None
+        while time.time() < end:
+            new = self.read()
+            if new:
+                lines += new
+                last = time.time()
+            elif last is not None and time.time() - last >= quiet:
+                break
+            time.sleep(0.05)
+        return lines
+
+    def _head(self):
+        with open(self.path, "rb") as f:
+            return f.read(self.HEAD)
+
+    def _rotated(self):
+        if self.archives is None:
+            return b""
+        candidates = glob.glob(self.archives)
+        if not candidates:
+            return b""
+        with gzip.open(max(candidates, key = os.path.getmtime), "rb") as f:
+            if f.read(len(self.head)) != self.head:
+                return b""
+            f.seek(self.offset)
+            return f.read()
+
+class ConsoleDrain:
+    """Reads a child's stdout pipe on a daemon thread so it never blocks on a full pipe; keeps the last `keep` lines"""
+
+    def __init__(self, stream, keep = 1000):
+        self.stream = stream
+        self.lines = collections.deque(maxlen = keep)
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        for line in iter(self.stream.readline, b""):
+            self.lines.append(line.decode("utf-8", "replace").rstrip("\r\n"))
@@ -0,0 +1,280 @@
+import array
+import bisect
+import math
+import os
+import struct
+import threading
+import time
+
+FIELDS = ("tps", "ram", "players")
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; BUCKETS are upper bounds in seconds"""
+
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def __len__(self):
+        return self.total
+
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            self.total += 1
+            self.sum += seconds
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, or None when empty"""
+        with self.lock:
+            if self.total == 0:
+                return None
+            rank = q * self.total
+            seen = 0
+            for n, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return self.BUCKETS[n] if n < len(self.BUCKETS) else float("inf")
+            return float("inf")
+
+    @property
+    def mean(self):
+        if self.total == 0:
+            return None
+        return self.sum / self.total
+
+    def cumulative(self):
+        """(upper bound, samples at or below it) per bucket, ending with +inf, plus the sum"""
+        with self.lock:
+            out = []
+            seen = 0
+            for bound, count in zip(self.BUCKETS + (float("inf"),), self.counts):
+                seen += count
+                out.append((bound, seen))
+            return out, self.sum
+
+
+class Rollup:
+    """
+    One resolution of a server's history: a ring of `capacity` buckets of
+    `width` seconds. Each bucket keeps the sample count, the sum of every field
+    and the lowest TPS / highest RAM seen, so short dips survive downsampling.
+    """
+
+    ARRAYS = (("start", "d"), ("count", "H"), ("tps", "f"), ("tpsMin", "f"), ("ram", "f"), ("ramMax", "f"), ("players", "f"))
+
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        self.head = -1
+        self.length = 0
+        for name, code in self.ARRAYS:
+            setattr(self, name, array.array(code, bytes(array.array(code).itemsize * capacity)))
+
+    def __len__(self):
+        return self.length
+
+    def add(self, t, tps, ram, players):
+        start = t - t % self.width
+        n = self.head
+        if n < 0 or self.start[n] != start:
+            if n >= 0 and start < self.start[n]:
+                return
+            n = self.head = (n + 1) % self.capacity
+            self.length = min(self.length + 1, self.capacity)
+            self.start[n] = start
+            self.count[n] = 0
+            self.tps[n] = self.ram[n] = self.players[n] = 0
+            self.tpsMin[n] = tps
+            self.ramMax[n] = ram
+        if self.count[n] < 65535:
+            self.count[n] += 1
+            self.tps[n] += tps
+            self.ram[n] += ram
+            self.players[n] += players
+        self.tpsMin[n] = min(self.tpsMin[n], tps)
+        self.ramMax[n] = max(self.ramMax[n], ram)
+
+    def slots(self, limit = None):
+        """Ring positions of the last `limit` buckets, oldest first"""
+        size = self.length if limit is None else min(limit, self.length)
+        return [(self.head - size + 1 + n) % self.capacity for n in range(size)]
+
+    def values(self, field, limit = None):
+        """(bucket start, value) pairs; tps/ram/players are bucket means, tpsMin/ramMax extremes"""
+        data = getattr(self, field)
+        if field in FIELDS:
+            return [(self.start[n], data[n] / self.count[n]) for n in self.slots(limit)]
+        return [(self.start[n], data[n]) for n in self.slots(limit)]
+
+    def latest(self, field):
+        if self.length == 0:
+            return None
+        n = self.head
+        return getattr(self, field)[n] / (self.count[n] if field in FIELDS else 1)
+
+
+class Series:
+
+    def __init__(self, fullId, typ, rollups):
+        self.fullId = fullId
+        self.type = typ
+        self.rollups = {width: Rollup(width, capacity) for width, capacity in rollups}
+        self.last = 0.0
+
+    def add(self, t, tps, ram, players):
+        self.last = t
+        for i in self.rollups.values():
+            i.add(t, tps, ram, players)
+
+
+class MetricsStore:
+    """
+    Per-server TPS, RAM and player history recorded from 0xf0 pings. Every
+    server gets a Series with preallocated array rings at each ROLLUPS width
+    (1s, 1m, 1h), so memory per server is fixed no matter how long it runs.
+    Fleet aggregates read the newest 1s bucket of every series that pinged
+    within `fresh` seconds.
+    """
+
+    ROLLUPS = ((1, 600), (60, 1440), (3600, 168))
+    MAGIC = b"RSMT"
+    HEADER = struct.Struct("<4sBdI")
+
+    def __init__(self, rollups = ROLLUPS, fresh = 30):
+        self.rollups = rollups
+        self.fresh = fresh
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.series)
+
+    def __contains__(self, fullId):
+        return fullId in self.series
+
+    def __getitem__(self, fullId):
+        return self.series[fullId]
+
+    def record(self, server, tps, ram, players, t = None):
+        if t is None:
+            t = time.time()
+        with self.lock:
+            s = self.series.get(server.fullId)
+            if s is None:
+                s = self.series[server.fullId] = Series(server.fullId, server.type, self.rollups)
+            s.type = server.type
+            s.add(t, tps, ram, players)
+
+    def history(self, fullId, field, width = 1, limit = None):
+        with self.lock:
+            s = self.series.get(fullId)
+            if s is None:
+                return []
+            return s.rollups[width].values(field, limit)
+
+    def drop(self, fullId):
+        with self.lock:
+            self.series.pop(fullId, None)
+
+    def watch(self, registry):
+        """Forget a server's history once it leaves the registry"""
+        registry.addListener(lambda event, server: self.drop(server.fullId) if event == "remove" else None)
+
+    def fleet(self, now = None):
+        """Mean TPS by type, p95 RAM, total players and live server count"""
+        if now is None:
+            now = time.time()
+        width = self.rollups[0][0]
+        tps = {}
+        rams = []
+        players = 0
+        with self.lock:
+            for s in self.series.values():
+                if now - s.last > self.fresh:
+                    continue
+                r = s.rollups[width]
+                tps.setdefault(s.type, []).append(r.latest("tps"))
+                rams.append(r.latest("ram"))
+                players += round(r.latest("players"))
+        rams.sort()
+        return {
+            "tps": {typ: sum(values) / len(values) for typ, values in tps.items()},
+            "ram_p95": rams[max(0, math.ceil(len(rams) * 0.95) - 1)] if rams else None,
+            "players": players,
+            "servers": len(rams)
+        }
+
+    def export(self, path):
+        """Write the filled part of every ring as raw arrays to path (atomically); load() reads it back"""
+        out = bytearray(self.HEADER.pack(self.MAGIC, 1, time.time(), len(self.series)))
+        with self.lock:
+            for s in self.series.values():
+                for text in (s.fullId, s.type or ""):
+                    raw = text.encode("utf-8")
+                    out += struct.pack("<H", len(raw)) + raw
+                out += struct.pack("<dB", s.last, len(s.rollups))
+                for width, r in s.rollups.items():
+                    out += struct.pack("<III", width, r.capacity, r.length)
+                    slots = r.slots()
+                    for name, code in Rollup.ARRAYS:
+                        a = getattr(r, name)
+                        out += array.array(code, (a[n] for n in slots)).tobytes()
+        with open(path + ".tmp", "wb") as f:
+            f.write(out)
+        os.replace(path + ".tmp", path)
+        return len(out)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, saved, count = cls.HEADER.unpack_from(data, 0)
+        if magic != cls.MAGIC or version != 1:
+            raise ValueError(path + " is not a metrics snapshot")
+        n = cls.HEADER.size
+        rollups = None
+        store = cls()
+        for i in range(count):
+            texts = []
+            for k in range(2):
+                size = struct.unpack_from("<H", data, n)[0]
+                texts.append(data[n + 2:n + 2 + size].decode("utf-8"))
+                n += 2 + size
+            last, levels = struct.unpack_from("<dB", data, n)
+            n += 9
+            s = Series(texts[0], texts[1] or None, ())
+            s.last = last
+            for k in range(levels):
+                width, capacity, length = struct.unpack_from("<III", data, n)
+                n += 12
+                r = Rollup(width, capacity)
+                r.head = length - 1
+                r.length = length
+                for name, code in Rollup.ARRAYS:
+                    a = getattr(r, name)
+                    size = a.itemsize * length
+                    a[:length] = array.array(code, data[n:n + size])
+                    n += size
+                s.rollups[width] = r
+            if rollups is None:
+                rollups = tuple((width, r.capacity) for width, r in s.rollups.items())
+            store.series[s.fullId] = s
+        if rollups is not None:
+            store.rollups = rollups
+        return store
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def store() -> MetricsStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = MetricsStore()
+        return _STORE
@@ -0,0 +1,125 @@
+import heapq
+import threading
+
+import rsglobal
+
+SPREAD = "spread"
+BINPACK = "binpack"
+POLICIES = {0: None, 1: SPREAD, 2: BINPACK}
+
+
+class PlacementEngine:
+    """
+    Answers "which server should the next player of type X join" from a heap
+    per (type, policy), so BungeeCord can ask for one target (0xe5) instead of
+    walking the whole 0xe2 list. Spread prefers the server with the most free
+    slots, binpack the one with the fewest that still has room. TPS below 20
+    and heap use past `ramSoft` cost a server slots in either order, and a
+    server below `minTps` or above `maxRam` of its RAM class is left out
+    until a later 0xf0 says it has recovered; that includes servers that
+    have registered but not sent their first 0xf0 yet.
+
+    Heap entries are never updated in place: update() pushes a new one with a
+    fresh stamp and best() discards stale or ineligible entries as it meets
+    them, so both are O(log n) amortized.
+    """
+
+    def __init__(self, registry, **kwargs):
+        self.registry = registry
+        self.policies = kwargs.get("policies", rsglobal.SERVER_PLACEMENT)
+        self.default = kwargs.get("default", SPREAD)
+        self.tpsWeight = kwargs.get("tpsWeight", 2.0)
+        self.ramWeight = kwargs.get("ramWeight", 25.0)
+        self.ramSoft = kwargs.get("ramSoft", 0.6)
+        self.minTps = kwargs.get("minTps", 15.0)
+        self.maxRam = kwargs.get("maxRam", 0.9)
+        self.heaps = {}
+        self.stamps = {}
+        self.reserved = {}
+        self.stamp = 0
+        self.placed = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        registry.addListener(self._event)
+
+    def policyFor(self, typ, policy = None):
+        return policy or self.policies.get(typ, self.default)
+
+    def update(self, server, arrived = True):
+        """Re-rank server after a 0xf0; arrived=True means its player list now covers earlier placements"""
+        with self.lock:
+            if arrived:
+                self.reserved.pop(server.fullId, None)
+            self._push(server)
+
+    def best(self, typ, policy = None):
+        """The server the next player of typ should join, or None; counts the player against it until its next 0xf0"""
+        policy = self.policyFor(typ, policy)
+        with self.lock:
+            heap = self.heaps.get((typ, policy))
+            if heap is None:
+                heap = self.heaps[(typ, policy)] = []
+                for i in self.registry.getByType(typ):
+                    self._entry(heap, policy, i)
+            while heap:
+                score, stamp, fullId = heap[0]
+                server = self.registry.getByFullId(fullId)
+                if self.stamps.get(fullId) != stamp or server is None or not self._eligible(server):
+                    heapq.heappop(heap)
+                    continue
+                self.reserved[fullId] = self.reserved.get(fullId, 0) + 1
+                self._push(server)
+                self.placed += 1
+                return server
+            self.misses += 1
+            return None
+
+    def forget(self, server):
+        with self.lock:
+            self.stamps.pop(server.fullId, None)
+            self.reserved.pop(server.fullId, None)
+
+    def stats(self):
+        with self.lock:
+            return {"placed": self.placed, "misses": self.misses, "heaps": {key: len(heap) for key, heap in self.heaps.items()}}
+
+    def _push(self, server):
+        self.stamp += 1
+        self.stamps[server.fullId] = self.stamp
+        for (typ, policy), heap in self.heaps.items():
+            if typ != server.type:
+                continue
+            self._entry(heap, policy, server)
+            if len(heap) > 2 * len(self.stamps) + 16:
+                self.heaps[(typ, policy)] = self._rebuild(heap)
+
+    def _entry(self, heap, policy, server):
+        if server.fullId not in self.stamps:
+            self.stamp += 1
+            self.stamps[server.fullId] = self.stamp
+        if not self._eligible(server):
+            return
+        free = server.maxplayers - len(server.players) - self.reserved.get(server.fullId, 0)
+        penalty = self.tpsWeight * max(0.0, 20.0 - float(server.tps)) + self.ramWeight * max(0.0, self._ram(server) - self.ramSoft)
+        score = (free if policy == BINPACK else -free) + penalty
+        heapq.heappush(heap, (score, self.stamps[server.fullId], server.fullId))
+
+    def _rebuild(self, heap):
+        heap = [i for i in heap if self.stamps.get(i[2]) == i[1]]
+        heapq.heapify(heap)
+        return heap
+
+    def _eligible(self, server):
+        return (server.status == rsglobal.SERVER_STATUS.RUNNING and not server.pooled and not server.draining
+                and len(server.players) + self.reserved.get(server.fullId, 0) < server.maxplayers
+                and float(server.tps) >= self.minTps and self._ram(server) <= self.maxRam)
+
+    def _ram(self, server):
+        limit = rsglobal.SERVER_RAM_MEGABYTES.get(server.ramId)
+        return server.ramused / limit if limit else 0.0
+
+    def _event(self, event, server):
+        if event == "remove":
+            self.forget(server)
+        else:
+            self.update(server, arrived = False)
@@ -0,0 +1,131 @@
+import collections
+import queue
+import threading
+import time
+import traceback
+
+import logger
+import rsglobal
+
+class WarmPool:
+    """
+    Keeps pre-copied, already booted DynamicServers per (template, RAM class,
+    server type) so CreateNew can hand one out instead of waiting for copytree
+    and a JVM cold start. Standby servers sit in the registry as HIBERNATING
+    with pooled set, which keeps them out of the 0xe2 list; acquire() flips them
+    live and a background worker builds the replacement. A standby that drops
+    out of the registry while still pooled is killed and its files removed.
+    """
+
+    def __init__(self, registry, sizes = None, **kwargs):
+        self.registry = registry
+        self.sizes = {}
+        self.ready = {}
+        self.building = collections.Counter()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.lock = threading.Lock()
+        self.todo = queue.Queue()
+        self.factory = kwargs.get("factory", rsglobal.DynamicServer)
+        self.LOG = logger.Logger(self)
+        registry.addListener(self._event)
+        for key, size in (rsglobal.SERVER_POOL if sizes is None else sizes).items():
+            self.configure(*key, size = size)
+        threading.Thread(target = self.run, daemon = True).start()
+
+    def configure(self, version, ramId = "S", type = "unknown", size = 1):
+        key = (version, ramId, type)
+        with self.lock:
+            self.sizes[key] = size
+            self.ready.setdefault(key, collections.deque())
+        self.todo.put(key)
+
+    def acquire(self, version, ramId = "S", type = "unknown"):
+        key = (version, ramId, type)
+        server = None
+        with self.lock:
+            ready = self.ready.get(key, collections.deque())
+            alive = [i for i in ready if i in self.registry]
+            ready.clear()
+            for i in sorted(alive, key = lambda i: not i.registered):
+                if server is None:
+                    server = i
+                else:
+                    ready.append(i)
+            if server is None:
+                self.misses[key] += 1
+            else:
+                self.hits[key] += 1
+        if key in self.sizes:
+            self.todo.put(key)
+        if server is None:
+            return None
+        server.pooled = False
+        if server.registered:
+            server.status = rsglobal.SERVER_STATUS.RUNNING
+        else:
+            server.status = rsglobal.SERVER_STATUS.LOADING
+        return server
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for key in set(self.sizes) | set(self.hits) | set(self.misses):
+                total = self.hits[key] + self.misses[key]
+                stats[key] = {
+                    "size": self.sizes.get(key, 0),
+                    "ready": len(self.ready.get(key, ())),
+                    "building": self.building[key],
+                    "hits": self.hits[key],
+                    "misses": self.misses[key],
+                    "hitRate": self.hits[key] / total if total else 0.0
+                }
+            return stats
+
+    def run(self):
+        while True:
+            key = self.todo.get()
+            while True:
+                with self.lock:
+                    if len(self.ready[key]) + self.building[key] >= self.sizes.get(key, 0):
+                        break
+                    self.building[key] += 1
+                try:
+                    server = self._build(*key)
+                except Exception:
+                    self.LOG.error("Unable to build a standby server for " + str(key) + ":\n" + traceback.format_exc())
+                    server = None
+                with self.lock:
+                    self.building[key] -= 1
+                    if server is not None:
+                        self.ready[key].append(server)
+                if server is None:
+                    break
+
+    def _build(self, version, ramId, type):
+        server = self.factory(version, ramId, type = type)
+        server.pooled = True
+        # liveness gives an unregistered standby the boot grace from here, not from before the copy
+        server.lastping = time.time()
+        server.startUp()
+        server.status = rsglobal.SERVER_STATUS.HIBERNATING
+        self.registry.append(server)
+        return server
+
+    def _event(self, event, server):
+        if event == "remove" and server.pooled:
+            key = (server.version, server.ramId, server.type)
+            with self.lock:
+                if server in self.ready.get(key, ()):
+                    self.ready[key].remove(server)
+            if key in self.sizes:
+                self.todo.put(key)
+            threading.Thread(target = self._cleanup, args = (server,), daemon = True).start()
+
+    def _cleanup(self, server):
+        """A standby that left the registry still has its JVM and directory; nothing else owns them"""
+        try:
+            server.kill()
+            server.removeFiles()
+        except Exception:
+            self.LOG.error("Cleaning up standby [RS-" + server.fullId + "] failed:\n" + traceback.format_exc())
@@ -0,0 +1,125 @@
+import collections
+import json
+import os
+import random
+import threading
+
+import logger
+
+PORT_RANGE = (128, 32767)
+JOURNAL = "ports.journal"
+LEGACY = "running.json"
+
+class PortAllocator:
+    """
+    Hands out server ports from a fixed range. Free ports sit in a shuffled
+    FIFO and a bitmap marks which are taken, so allocate and release are O(1).
+    Every change is appended to a journal ("+ port fullId" / "- port fullId")
+    that is replayed on start and compacted to just the live entries once it
+    outgrows them.
+    """
+
+    def __init__(self, path = JOURNAL, low = PORT_RANGE[0], high = PORT_RANGE[1], legacy = LEGACY):
+        self.path = path
+        self.low = low
+        self.high = high
+        self.lock = threading.Lock()
+        self.used = bytearray(high - low + 1)
+        self.owners = {}
+        self.records = 0
+        self.LOG = logger.Logger(self)
+
+        if os.path.exists(path):
+            self._replay()
+        elif legacy is not None and os.path.exists(legacy):
+            self._migrate(legacy)
+        free = [i for i in range(low, high + 1) if not self.used[i - low]]
+        random.shuffle(free)
+        self.free = collections.deque(free)
+        self._compact()
+
+    def __len__(self):
+        return len(self.owners)
+
+    def allocate(self, fullId: str) -> int:
+        with self.lock:
+            if fullId in self.owners:
+                return self.owners[fullId]
+            if not self.free:
+                raise RuntimeError("No free ports left in " + str(self.low) + "-" + str(self.high))
+            port = self.free.popleft()
+            self.used[port - self.low] = 1
+            self.owners[fullId] = port
+            self._journal("+", port, fullId)
+            return port
+
+    def release(self, fullId: str):
+        with self.lock:
+            port = self.owners.pop(fullId, None)
+            if port is None:
+                return None
+            self.used[port - self.low] = 0
+            self.free.append(port)
+            self._journal("-", port, fullId)
+            return port
+
+    def portOf(self, fullId: str):
+        return self.owners.get(fullId)
+
+    def watch(self, registry):
+        """Release a server's port once it leaves the registry, whether it stopped, failed or went quiet"""
+        registry.addListener(lambda event, server: self.release(server.fullId) if event == "remove" else None)
+
+    def _journal(self, op, port, fullId):
+        self.file.write(op + " " + str(port) + " " + fullId + "\n")
+        self.file.flush()
+        self.records += 1
+        if self.records > max(1024, 4 * len(self.owners)):
+            self._compact()
+
+    def _compact(self):
+        if getattr(self, "file", None) is not None:
+            self.file.close()
+        with open(self.path + ".tmp", "w") as f:
+            for fullId, port in self.owners.items():
+                f.write("+ " + str(port) + " " + fullId + "\n")
+        os.replace(self.path + ".tmp", self.path)
+        self.records = len(self.owners)
+        self.file = open(self.path, "a")
+
+    def _claim(self, fullId, port):
+        if not self.low <= port <= self.high or self.used[port - self.low]:
+            return
+        self.used[port - self.low] = 1
+        self.owners[fullId] = port
+
+    def _replay(self):
+        for line in open(self.path):
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+            op, port, fullId = parts[0], int(parts[1]), parts[2]
+            if op == "+":
+                self._claim(fullId, port)
+            elif op == "-" and self.owners.get(fullId) == port:
+                del self.owners[fullId]
+                self.used[port - self.low] = 0
+
+    def _migrate(self, legacy):
+        # running.json never released anything; keep only servers whose directory still exists
+        kept = 0
+        for fullId, port in json.load(open(legacy)).get("usedPorts", {}).items():
+            if os.path.isdir(os.path.join("running", fullId)):
+                self._claim(fullId, port)
+                kept += 1
+        self.LOG.info(f"Migrated {kept} port(s) from {legacy}")
+
+_ALLOCATOR = None
+_ALLOCATOR_LOCK = threading.Lock()
+
+def allocator() -> PortAllocator:
+    global _ALLOCATOR
+    with _ALLOCATOR_LOCK:
+        if _ALLOCATOR is None:
+            _ALLOCATOR = PortAllocator()
+        return _ALLOCATOR
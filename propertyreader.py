@@ -1,25 +1,51 @@
 import json
+import os
+
+def formatValue(value):
+    if isinstance(value, str):
+        return value
+    elif value == None:
+        return ""
+    return json.dumps(value)
+
+def parseValue(raw):
+    if raw == '':
+        return None
+    elif raw.isnumeric():
+        return int(raw)
+    elif raw == 'true':
+        return True
+    elif raw == 'false':
+        return False
+    return raw
 
 class PropertyFile:
+    """
+    A .properties file kept in its original order, comments and blank lines
+    included, with a dict index for O(1) lookups. Untouched lines are written
+    back byte for byte. With lazy set, a lookup scans the raw lines from the
+    end and only builds an item for the line it is after, which keeps large
+    plugin configs cheap to open; a full parse waits for render, keys and the
+    like. A key that appears more than once resolves to its last line for
+    get, put and render alike, as it does for the server reading the file.
+    """
 
-    def __init__(self, ostream):
-        self.properties = []
-        self.file = ostream
-        for i in ostream.readlines():
-            if i.startswith("#"):
-                pass
-            else:
-                d = i.strip().split("=")
-                if d[1] == '':
-                    self.properties.append(PropertyItem(d[0], None))
-                elif d[1].isnumeric():
-                    self.properties.append(PropertyItem(d[0], int(d[1])))
-                elif d[1] == 'true':
-                    self.properties.append(PropertyItem(d[0], True))
-                elif d[1] == 'false':
-                    self.properties.append(PropertyItem(d[0], False))
-                else:
-                    self.properties.append(PropertyItem(d[0], d[1]))
+    def __init__(self, ostream, lazy = False):
+        if isinstance(ostream, str):
+            self.path = ostream
+            self.file = None
+            with open(ostream) as f:
+                raw = f.read().splitlines()
+        else:
+            self.path = ostream.name
+            self.file = ostream
+            raw = ostream.read().splitlines()
+        self.lines = raw
+        self.index = {}
+        self.resolved = set()
+        self.parsed = 0
+        if not lazy:
+            self._parse()
 
     def __repr__(self):
         d = []
@@ -31,38 +57,139 @@ class PropertyFile:
             d.insert(3, "...")
         return "PropertyFile(" + ", ".join(d) + ")"
 
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __getitem__(self, key):
+        item = self._find(key)
+        if item is None:
+            raise KeyError(key)
+        return item.value
+
+    @property
+    def properties(self):
+        self._parse()
+        return [i for i in self.lines if isinstance(i, PropertyItem)]
+
+    def keys(self):
+        return [i.key for i in self.properties]
+
+    def get(self, key, default = None):
+        item = self._find(key)
+        if item is None:
+            return default
+        return item.value
+
     def put(self, key, value):
-        for i in self.properties:
-            if i.key == key:
-                i.value = value
-                break
+        item = self._find(key)
+        if item is None:
+            item = PropertyItem(key, value)
+            self.lines.append(item)
+            self.index[key] = item
+            self.parsed += 1
         else:
-            self.properties.append(PropertyItem(key, value))
+            item.value = value
+            item.raw = None
 
-    def save(self):
-        f = open(self.file.name, "w")
-        for i in self.properties:
-            if isinstance(i.value, str):
-                f.write(i.key + "=" + i.value)
-            elif i.value == None:
-                f.write(i.key + "=")
+    def put_many(self, values):
+        for key, value in dict(values).items():
+            self.put(key, value)
+
+    def render(self, overrides = None):
+        self._parse()
+        overrides = dict(overrides or {})
+        last = {i.key: n for n, i in enumerate(self.lines) if isinstance(i, PropertyItem) and i.key in overrides}
+        out = []
+        for n, i in enumerate(self.lines):
+            if isinstance(i, PropertyItem) and last.get(i.key) == n:
+                out.append(i.key + "=" + formatValue(overrides.pop(i.key)))
             else:
-                f.write(i.key + "=" + json.dumps(i.value))
-            f.write("\n")
-        f.close()
-        self.file.close()
+                out.append(i.text())
+        for key, value in overrides.items():
+            out.append(key + "=" + formatValue(value))
+        return "\n".join(out) + "\n"
+
+    def save(self, path = None):
+        path = path or self.path
+        text = self.render()
+        with open(path + ".tmp", "w") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+        self.close()
 
     def close(self):
-        self.file.close()
-        
+        if self.file is not None:
+            self.file.close()
+
+    def _find(self, key):
+        if self.parsed < len(self.lines) and key not in self.resolved:
+            self._scan(key)
+        return self.index.get(key)
+
+    def _scan(self, key):
+        """Index the last line that sets key, leaving every other unparsed line a plain string"""
+        for n in range(len(self.lines) - 1, -1, -1):
+            line = self.lines[n]
+            if isinstance(line, PropertyItem):
+                if line.key == key:
+                    break
+                continue
+            if not isinstance(line, str):
+                continue
+            stripped = line.strip()
+            if stripped == "" or stripped.startswith("#") or stripped.startswith("!"):
+                continue
+            k, sep, raw = stripped.partition("=")
+            if k == key:
+                item = PropertyItem(key, parseValue(raw), line)
+                self.lines[n] = item
+                self.index[key] = item
+                self.parsed += 1
+                break
+        self.resolved.add(key)
+
+    def _parse(self):
+        if self.parsed == len(self.lines):
+            return
+        for n, line in enumerate(self.lines):
+            if isinstance(line, str):
+                stripped = line.strip()
+                if stripped == "" or stripped.startswith("#") or stripped.startswith("!"):
+                    line = PropertyComment(line)
+                else:
+                    key, sep, raw = stripped.partition("=")
+                    line = PropertyItem(key, parseValue(raw), line)
+                self.lines[n] = line
+                self.parsed += 1
+            if isinstance(line, PropertyItem):
+                self.index[line.key] = line
+
 class PropertyItem:
 
-    def __init__(self, key, value):
+    __slots__ = ("key", "value", "raw")
+
+    def __init__(self, key, value, raw = None):
         self.key = key
         self.value = value
+        self.raw = raw
 
     def __repr__(self):
         return f"PropertyItem({self.key}, {self.value}: {self.value.__class__.__name__})"
 
+    def text(self):
+        if self.raw is not None:
+            return self.raw
+        return self.key + "=" + formatValue(self.value)
+
 class PropertyComment:
-    pass
+
+    __slots__ = ("raw",)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __repr__(self):
+        return f"PropertyComment({self.raw!r})"
+
+    def text(self):
+        return self.raw
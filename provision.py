@@ -0,0 +1,160 @@
+import concurrent.futures
+import threading
+import time
+import traceback
+
+import logger
+import ports
+import rsglobal
+
+class Job:
+
+    STAGES = ("allocate", "copy", "configure", "boot", "register")
+
+    def __init__(self, server):
+        self.server = server
+        self.stage = "queued"
+        self.error = None
+        self.created = time.time()
+        self.timings = {}
+        self.booted = None
+        self.timer = None
+        self.createdDir = False
+
+    def __repr__(self):
+        return f"Job([RS-{self.server.fullId}], stage={self.stage})"
+
+    @property
+    def done(self):
+        return self.stage in ("done", "failed")
+
+
+class Provisioner:
+    """
+    Creates DynamicServers off the Tk thread. Every requested server becomes a
+    Job that runs allocate -> copy -> configure -> boot on a worker pool, with
+    the server in the registry as SETUP until it boots and LOADING until its
+    first 0x01 registration turns it RUNNING. A failed job kills the process
+    it booted and deletes the server's directory, but only if its own copy
+    stage created that directory. Jobs run in parallel across
+    `workers`; onComplete(job) / onFailed(job) are the only callbacks, fired
+    from whatever thread finished the job.
+    """
+
+    def __init__(self, registry, workers = 8, **kwargs):
+        self.registry = registry
+        self.factory = kwargs.get("factory", rsglobal.DynamicServer)
+        self.onComplete = kwargs.get("onComplete")
+        self.onFailed = kwargs.get("onFailed")
+        self.timeout = kwargs.get("timeout", rsglobal.SERVER_BOOT_TIMEOUT)
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix = "provision")
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.LOG = logger.Logger(self)
+        registry.addListener(self._event)
+
+    def request(self, version, ramId = "S", count = 1, **kwargs):
+        """Queue count new servers built from kwargs (as for DynamicServer) and return their Jobs"""
+        jobs = []
+        for n in range(count):
+            server = self.factory(version, ramId, handleFile = False, **kwargs)
+            server.status = rsglobal.SERVER_STATUS.SETUP
+            job = Job(server)
+            # raises ValueError for a fullId that is already taken, before a job for it exists
+            self.registry.append(server)
+            with self.lock:
+                self.jobs[server.fullId] = job
+            self.executor.submit(self.run, job)
+            jobs.append(job)
+        return jobs
+
+    def pending(self):
+        with self.lock:
+            return [i for i in self.jobs.values() if not i.done]
+
+    def run(self, job):
+        server = job.server
+        try:
+            for stage, step in (("allocate", server.allocate), ("copy", server.copy), ("configure", server.configure), ("boot", server.startUp)):
+                job.stage = stage
+                if stage == "boot":
+                    # liveness counts from boot, not from when the job was queued
+                    server.lastping = time.time()
+                start = time.perf_counter()
+                step()
+                if stage == "copy":
+                    job.createdDir = True
+                job.timings[stage] = time.perf_counter() - start
+        except Exception as e:
+            job.error = e
+            self.LOG.error(f"Provisioning [RS-{server.fullId}] failed at {job.stage}:\n" + traceback.format_exc())
+            self._fail(job)
+            return
+        with self.lock:
+            if job.done:
+                return
+            job.stage = "register"
+            job.booted = time.perf_counter()
+            job.timer = threading.Timer(self.timeout, self._expire, (job,))
+            job.timer.daemon = True
+            job.timer.start()
+        if server.registered:
+            self._finish(job)
+
+    def _finish(self, job):
+        with self.lock:
+            if job.stage != "register":
+                return
+            job.stage = "done"
+            job.timings["register"] = time.perf_counter() - job.booted
+            if job.timer is not None:
+                job.timer.cancel()
+            self.jobs.pop(job.server.fullId, None)
+        self.LOG.info(f"[RS-{job.server.fullId}] provisioned in {time.time() - job.created:.1f}s")
+        if self.onComplete is not None:
+            self.onComplete(job)
+
+    def _fail(self, job):
+        with self.lock:
+            if job.done:
+                return
+            job.stage = "failed"
+            if job.timer is not None:
+                job.timer.cancel()
+            self.jobs.pop(job.server.fullId, None)
+        job.server.status = rsglobal.SERVER_STATUS.STOPPED
+        self.registry.discard(job.server)
+        ports.allocator().release(job.server.fullId)
+        self.executor.submit(self._cleanup, job)
+        if self.onFailed is not None:
+            self.onFailed(job)
+
+    def _cleanup(self, job):
+        """Kill whatever the boot stage started and delete the server directory if this job created it"""
+        server = job.server
+        try:
+            server.kill()
+            if job.createdDir:
+                server.removeFiles()
+            else:
+                server.logs.close()
+        except Exception:
+            self.LOG.error(f"Cleaning up [RS-{server.fullId}] failed:\n" + traceback.format_exc())
+
+    def _expire(self, job):
+        if job.error is None:
+            job.error = TimeoutError(f"no 0x01 registration within {self.timeout}s")
+        self.LOG.warn(f"[RS-{job.server.fullId}] did not register in time")
+        self._fail(job)
+
+    def _event(self, event, server):
+        if event == "status" and server.status == rsglobal.SERVER_STATUS.RUNNING or event == "remove":
+            with self.lock:
+                job = self.jobs.get(server.fullId)
+            if job is None:
+                return
+            if event == "remove":
+                job.error = job.error or RuntimeError("removed from the server list while provisioning")
+                self._fail(job)
+            else:
+                self._finish(job)
@@ -1,16 +1,20 @@
 
 import socket
-import tkinter as tk
-import tkinter.messagebox as tkmsg
+import asyncio
+import struct
+import collections
 
 import logger
-import rsglobal
-import datetime
+import fanout
+import metrics
+import instrument
+import handlers
+import placement
+import snapshot
 import time
-import json
-import os
 import threading
 import traceback
+import concurrent.futures
 
 class Status:
 
@@ -21,52 +25,67 @@ class Status:
     NO_AUTH = b"\x10"
     INTERNAL_ERR = b"\xa0"
 
+class Framing:
+    """
+    Framed mode keeps one connection open for many packets. A client opts in by
+    sending HELLO followed by the version it speaks; the listener answers with the
+    version it accepted, or Status.NULL if it only does one-shot packets. After
+    that every request and response is HEADER (payload length, sequence number)
+    followed by the payload, and responses echo the sequence of their request.
+    Frames the listener sends on its own (0xee pushes) carry sequence PUSH,
+    which is reserved: clients number requests 0 to PUSH - 1 and wrap back to
+    0, and a request frame carrying PUSH closes the connection.
+    """
+
+    HELLO = 0xfe
+    VERSION = 1
+    PUSH = 0xffff
+    HEADER = struct.Struct("<IH")
+    MAX_SIZE = 1048576
+
+    def frame(seq, payload):
+        return Framing.HEADER.pack(len(payload), seq) + payload
+
 class Reader:
 
+    BYTE = struct.Struct("<B")
+    SHORT = struct.Struct("<H")
+    INTEGER = struct.Struct("<I")
+    LONG = struct.Struct("<Q")
+
+    SERVER_CODES = {0x00: "T", 0x01: "S", 0x02: "M", 0x03: "B", 0x04: "G"}
+
     def __init__(self, data=b""):
+        if isinstance(data, str):
+            data = data.encode("latin-1")
         self.data = data
+        self.view = memoryview(data)
         self.pointer = 0
 
     def readServerCode(self):
-        b = self.readByte()
-        if b == 0x00:
-            return "T"
-        elif b == 0x01:
-            return "S"
-        elif b == 0x02:
-            return "M"
-        elif b == 0x03:
-            return "B"
-        elif b == 0x04:
-            return "G"
+        return self.SERVER_CODES.get(self.readByte())
 
     def readByte(self):
-        x = self.data[self.pointer]
+        x = self.view[self.pointer]
         self.pointer += 1
-        if isinstance(x, int):
-            return x
-        return ord(x)
-                         
+        return x
+
     def readShort(self):
-        n = 0
-        for i in range(2):
-            n += self.readByte() * 256 ** i
+        n = self.SHORT.unpack_from(self.view, self.pointer)[0]
+        self.pointer += 2
         return n
-    
 
     def readSignedShort(self):
         return self.readShort() - 32768
 
     def readInteger(self):
-        n = 0
-        for i in range(4):
-            n += self.readByte() * 256 ** i
+        n = self.INTEGER.unpack_from(self.view, self.pointer)[0]
+        self.pointer += 4
         return n
 
     def readLong(self):
-        n = 0
-        for i in range(8):
-            n += self.readByte() * 256 ** i
+        n = self.LONG.unpack_from(self.view, self.pointer)[0]
+        self.pointer += 8
         return n
 
     def readSignedLong(self):
@@ -77,9 +96,11 @@ class Reader:
 
     def readString(self):
         size = self.readShort()
-        x = ""
-        for i in range(size):
-            x += chr(self.readByte())
+        end = self.pointer + size
+        if end > len(self.view):
+            raise IndexError("String of " + str(size) + " bytes runs past the end of the packet")
+        x = str(self.view[self.pointer:end], "latin-1")
+        self.pointer = end
         return x
 
     def readBoolean(self):
@@ -89,24 +110,29 @@ class Reader:
 
     def readTypeArray(self):
         typ_i = self.readByte()
-        typ = self.types[typ_i]
         size = self.readShort()
-        arr = []
-        for i in range(size):
-            arr.append(typ(self))
-        return arr
+        if typ_i in self.fixed:
+            code, width, offset = self.fixed[typ_i]
+            arr = list(struct.unpack_from("<" + str(size) + code, self.view, self.pointer))
+            self.pointer += size * width
+            if offset:
+                arr = [i - offset for i in arr]
+            elif typ_i == 8:
+                arr = [i != 0 for i in arr]
+            return arr
+        typ = self.types[typ_i]
+        return [typ(self) for i in range(size)]
 
     def readMixedArray(self):
         size = self.readShort()
+        types = self.types
         arr = []
         for i in range(size):
-            typ_i = self.readByte()
-            typ = self.types[typ_i]
-            arr.append(typ(self))
+            arr.append(types[self.readByte()](self))
         return arr
 
     def writeByte(self, b):
-        self.data += bytes(chr(b).encode("latin-1"))
+        self.writePureBytes(bytes(chr(b).encode("latin-1")))
 
     def writeShort(self, s):
         if s > 65535:
@@ -134,7 +160,19 @@ class Reader:
             self.writeByte(ord(i))
 
     def writePureBytes(self, b):
+        self.view.release()
         self.data += b
+        self.view = memoryview(self.data)
+
+    # type byte -> (struct code, width, signed offset) for arrays decoded in one unpack
+    fixed = {
+        0: ("B", 1, 0),
+        1: ("H", 2, 0),
+        2: ("H", 2, 32768),
+        3: ("I", 4, 0),
+        4: ("I", 4, 2147483648),
+        8: ("B", 1, 0)
+    }
 
     types = {
         0: readByte,
@@ -150,32 +188,37 @@ class Reader:
 
 class OutPacket:
 
+    SHORT = struct.Struct("<H")
+    INTEGER = struct.Struct("<I")
+    LONG = struct.Struct("<Q")
+
     def __init__(self, typebyte):
-        self.data = b""
+        self.data = bytearray()
         self.writeByte(typebyte)
 
     def writeByte(self, b):
-        self.data += bytes(chr(b).encode("latin-1"))
+        self.data.append(b)
 
     def writeShort(self, s):
         if s > 65535:
             raise TypeError("s must < 65536!")
         if s < 0:
             raise TypeError("s must >= 0! Otherwise use writeSignedShort")
-        for i in range(2):
-            b = int(s % 256)
-            self.writeByte(b)
-            s = (s - b) / 256
+        self.data += self.SHORT.pack(s)
 
-    def writeInteger(self, i):
+    def writeInteger(self, s):
         if s > 2147483647:
             raise TypeError("s must < 2147483647!")
         if s < 0:
             raise TypeError("s must >= 0! Otherwise use writeSignedInteger")
-        for i in range(4):
-            b = int(s % 256)
-            self.writeByte(b)
-            s = (s - b) / 256
+        self.data += self.INTEGER.pack(s)
+
+    def writeLong(self, s):
+        if s > 18446744073709551615:
+            raise TypeError("s must < 18446744073709551616!")
+        if s < 0:
+            raise TypeError("s must >= 0!")
+        self.data += self.LONG.pack(s)
 
     def writeSignedShort(self, s):
         if s > 32767:
@@ -189,11 +232,13 @@ class OutPacket:
         if len(s) > 65535:
             raise TypeError("String is too long! Max len is 65535!")
         self.writeShort(len(s))
-        for i in s:
-            self.writeByte(ord(i))
+        self.data += s.encode("latin-1")
+
+    def writePureBytes(self, b):
+        self.data += b
 
     def writeTypeArray(self, a):
-        if len(a) == None:
+        if len(a) == 0:
             self.writeByte(0)
             self.writeShort(0)
             return
@@ -229,12 +274,12 @@ class OutPacket:
 
     def writeByObjectClass(self, obj):
         if isinstance(obj, bytes):
-            self.writeByte(obj)
+            self.writeByte(obj[0])
         elif isinstance(obj, int):
             if obj < 65536:
                 self.writeShort(obj)
             elif obj < 2147483648:
-                self.writeInt(obj)
+                self.writeInteger(obj)
         elif isinstance(obj, list):
             self.writeMixedArray(obj)
         elif isinstance(obj, str):
@@ -245,230 +290,293 @@ class OutPacketGroup:
 
     def __init__(self, group):
         self.group = group
-        self.data = Reader()
-        self.data.writeShort(len(group))
+        self.data = bytearray(2 + sum(2 + len(i.data) for i in group))
+        OutPacket.SHORT.pack_into(self.data, 0, len(group))
+        n = 2
         for i in self.group:
-            self.data.writeShort(len(i.data))
-            self.data.writePureBytes(i.data)
-        
-        
+            size = len(i.data)
+            if size > 65535:
+                raise TypeError("Packet is too long to group! Max len is 65535!")
+            OutPacket.SHORT.pack_into(self.data, n, size)
+            self.data[n + 2:n + 2 + size] = i.data
+            n += 2 + size
+
+
+class Backpressure:
+
+    DROP_OLDEST = "DROP_OLDEST"
+    DROP_NEWEST = "DROP_NEWEST"
+
+class PacketQueue:
+    """
+    Outbound packets waiting for a server's next poll. Any thread may append;
+    drain() hands over everything queued so far in one step, so nothing appended
+    concurrently is lost. Past capacity the policy decides which ordinary packet
+    is dropped; CRITICAL packets (shutdown, kick, Bungee register/unregister
+    notices) are always kept. Repeats of an idempotent packet that is still
+    pending are coalesced into the first one. A register or unregister notice
+    is only dropped as a repeat of the newest pending notice for the same
+    server, so a register, stop, register sequence keeps all three in order.
+    A packet too long to group is refused by append() rather than breaking
+    the poll reply that would carry it.
+    """
+
+    CRITICAL = (0xaf, 0xb0, 0xe2, 0xe3)
+    IDEMPOTENT = (0xaf, 0xb0)
+    NOTICES = (0xe2, 0xe3)
+
+    def __init__(self, capacity = 256, policy = Backpressure.DROP_OLDEST):
+        self.capacity = capacity
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.packets = collections.deque()
+        self.pending = set()
+        self.notices = {}
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.drained = 0
+
+    def __len__(self):
+        return len(self.packets)
+
+    def __repr__(self):
+        return f"PacketQueue(depth={len(self.packets)}, dropped={self.dropped}, coalesced={self.coalesced})"
+
+    def append(self, packet):
+        if len(packet.data) > 65535:
+            raise TypeError("Packet is too long to group! Max len is 65535!")
+        typ = packet.data[0]
+        with self.lock:
+            self.enqueued += 1
+            if typ in self.IDEMPOTENT or typ in self.NOTICES:
+                key = bytes(packet.data)
+                if key in self.pending if typ in self.IDEMPOTENT else self.notices.get(self._subject(key)) == key:
+                    self.coalesced += 1
+                    return True
+            if len(self.packets) >= self.capacity and typ not in self.CRITICAL:
+                if self.policy == Backpressure.DROP_NEWEST or not self._evict():
+                    self.dropped += 1
+                    return False
+            if typ in self.IDEMPOTENT:
+                self.pending.add(key)
+            elif typ in self.NOTICES:
+                self.notices[self._subject(key)] = key
+            self.packets.append(packet)
+            return True
+
+    def drain(self):
+        with self.lock:
+            packets = list(self.packets)
+            self.packets.clear()
+            self.pending.clear()
+            self.notices.clear()
+            self.drained += len(packets)
+            return packets
+
+    @property
+    def dropRate(self):
+        if self.enqueued == 0:
+            return 0.0
+        return self.dropped / self.enqueued
+
+    def _evict(self):
+        for i in self.packets:
+            if i.data[0] not in self.CRITICAL:
+                self.packets.remove(i)
+                self.pending.discard(bytes(i.data))
+                self.dropped += 1
+                return True
+        return False
+
+    def _subject(self, key):
+        """The ram byte and id string a 0xe2/0xe3 notice is about"""
+        return key[1:4 + OutPacket.SHORT.unpack_from(key, 2)[0]]
+
 
 class ProxyListener:
 
-    def __init__(self, servers, server_list, opened_details, bungee):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.bind(("127.0.0.1", 127))
-        self.socket.listen()
+    def __init__(self, servers, server_list, opened_details, bungee, **kwargs):
+        self.host = kwargs.get("host", "127.0.0.1")
+        self.port = kwargs.get("port", 127)
         self.servers = servers
         self.server_list = server_list
         self.bungee = bungee
         self.opened_details = opened_details
         self.LOG = logger.Logger(self)
         self.awaitWarps = []
+        self.ready = threading.Event()
+        self.fanout = kwargs.get("fanout") or fanout.FanOut(server_list)
+        self.metrics = kwargs.get("metrics") or metrics.store()
+        self.handlers = kwargs.get("handlers") or handlers.registry()
+        self.placement = kwargs.get("placement") or placement.PlacementEngine(server_list)
+        self.snapshot = kwargs.get("snapshot") or snapshot.ServerListSnapshot(server_list)
+        self.parseErrors = 0
+        self.profile = instrument.OpcodeProfile()
+        self.tracer = instrument.SamplingTracer()
+        self.instruments = (self.profile,) if kwargs.get("profile", True) else ()
+
+        if kwargs.get("autostart", True):
+            self.listen()
+
+    def listen(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen()
+        self.port = self.socket.getsockname()[1]
+        self.ready.set()
 
         while True:
             #print('waiting for connection...')
             con, addr = self.socket.accept()
-            data = con.recv(1024)
-            #print(f"data: {data}, addr: {addr}")
-
-            packet = Reader(data)
-            typ = packet.readByte()
             try:
-                if typ == 1:
-                    ram = packet.readByte()
-                    temp = packet.readString()
-                    idd = packet.readString()
-                    name = packet.readString()
-                    svtype = packet.readString()
-                    port = packet.readShort()
-                    for i in self.server_list:
-                        if i.id == idd:
-                            print(i.name, name)
-                            #i.name = name
-                            i.status = rsglobal.SERVER_STATUS.RUNNING
-                            break
-                    else:
-                        srv = rsglobal.DynamicServer(temp, rsglobal.SERVER_RAM_BYTENUM[ram], sid = idd, name = name, type = svtype, handleFile = False)
-                        srv.att = "Unverified: Server is created via unexsistent."
-                        self.server_list.append(srv)
-
-                    con.send(OutPacketGroup([]).data.data)
-                    con.close()
-
-                    crt = OutPacket(0xe2)
-                    crt.writeByte(ram)
-                    crt.writeString(idd)
-                    crt.writeShort(port)
-                    print(port)
-                    if svtype == "verify":
-                        c = 0x00
-                        d = 0
-                    crt.writeByte(c)
-                    crt.writeShort(d)
-                    self.bungee.queued.append(crt)
-                    
-                    
-                    continue
-
-
-                
-                if typ == 0xa2:
-                    ram = packet.readByte()
-                    idd = packet.readString()
-                    msg = packet.readString()
-                    threading.Thread(target=lambda: tkmsg.showerror(f"[RS-{rsglobal.SERVER_RAM_BYTENUM[ram] + idd}] Broadcast System", datetime.datetime.now().strftime("%H:%M:%S") + f" An internal error occured on server [RS-{rsglobal.SERVER_RAM_BYTENUM[ram] + idd}]:\n\n" + msg)).start()
-                    con.send(Status.OK)
-                    con.close()
-                    continue
-                if typ == 0xa0:
-                    ram = packet.readByte()
-                    idd = packet.readString()
-                    t = packet.readByte()
-                    msg = packet.readString()
-
-                    m = datetime.datetime.now().strftime("%H:%M:%S") + " " + msg
-                    if t == 0:
-                        func = tkmsg.showinfo
-                    elif t == 1:
-                        func = tkmsg.showwarning
-                    elif t == 2:
-                        func = tkmsg.showerror
-                    threading.Thread(target=lambda: func(f"[RS-{rsglobal.SERVER_RAM_BYTENUM[ram] + idd}] Alert", m)).start()
-                    con.send(OutPacketGroup([]).data.data)
-                    con.close()
-                    continue
-
-                if typ == 0xa1:
-                    ram = packet.readByte()
-                    idd = packet.readString()
-                    t = packet.readByte()
-                    msg = packet.readString()
-
-                    if t == 0:
-                        l = "INFO"
-                    elif t == 1:
-                        l = "WARNING"
-                    else:
-                        l = "ERROR"
-                    
-                    for i in self.server_list:
-                        if i.id == idd:
-                            i.logs.append({"time": time.time(), "level": l, "msg": msg})
-                            break
-
-                    con.send(OutPacketGroup([]).data.data)
-                    con.close()
-                    continue
-
-                if typ == 0xae:
-                    ram = packet.readByte()
-                    idd = packet.readString()
-                    for i in self.server_list:
-                        if i.id == idd:
-                            i.status = "STOPPED"
-                            self.server_list.remove(i)
-                            break
-                    con.send(OutPacketGroup([]).data.data)
-                    con.close()
-
-                    crt = OutPacket(0xe3)
-                    crt.writeByte(ram)
-                    crt.writeString(idd)
-                    self.bungee.queued.append(crt)
-                    
-                    continue
-                
-                if typ == 0xf0:
-                    ram = packet.readByte()
-                    sid = packet.readString()
-                    nam = packet.readString()
-                    tps = float(packet.readString())
-                    ramuse = packet.readLong()
-                    players = packet.readTypeArray()
-                    for i in self.server_list:
-                        if i.id == sid:
-                            i.name = nam
-                            i.players = players     
-                            i.ramused = ramuse
-                            i.lastping = time.time()
-                            i.tps = tps
-                            break
-                    else:
-                        pack = OutPacket(0xc4)
-                        pack.writeString("Server Not Found!")
-                        con.send(OutPacketGroup([pack]).data.data)
-                        con.close()
-                        continue
-                    group = OutPacketGroup(i.queued)
-                    con.send(group.data.data)
-                    con.close()
-                    i.queued = []
-                    continue
-
-                if typ == 0xe9:
-                    a = packet.readServerCode()
-                    b = packet.readString()
-
-                    c = packet.readServerCode()
-                    d = packet.readString()
-
-                    e = packet.readString()
-
-                    crt = OutPacket(0xe9)
-                    crt.writeString(c + d)
-                    crt.writeString(e)
-                    self.bungee.queued.append(crt)
-
-                    con.send(OutPacketGroup([]).data.data)
-                    con.close()
-                    continue
-
-                if typ == 0xe0:
-                    playeramt = packet.readShort()
-                    group = OutPacketGroup(self.bungee.queued)
-                    con.send(group.data.data)
-                    con.close()
-                    self.bungee.queued = []
-                    continue
-
-                if typ == 0xe1:
-                    threading.Thread(target=lambda: tkmsg.showinfo("[RS-BungeeCord] Alert", "BungeeCord is ready!")).start()
-                    self.LOG.info("BungeeCord is ready!")
-                    con.send(OutPacketGroup([]).data.data)
-                    con.close()
-                    continue
-
-                if typ == 0xe2:
-
-                    nam = packet.readString()
-                    
-                    al = []
-                    for i in self.server_list:
-                        al.append([i.fullId, len(i.players), i.maxplayers, i.type, i.name])
-                    ot = OutPacket(0xe4)
-                    ot.writeString(nam)
-                    ot.writeShort(len(al))
-                    for i in al:
-                        ot.writeString(i[0])
-                        ot.writeString(i[4])
-                        ot.writeShort(i[1])
-                        ot.writeShort(i[2])
-                        ot.writeString(i[3])
-                    con.send(OutPacketGroup([ot]).data.data)
-
-                    print(OutPacketGroup([ot]).data.data)
-                    con.close()
-                    continue
-            except Exception as e:
-                n = traceback.format_exc()
-                print("[Proxy] Packet " + str(data) + " issued an invalid request!")
-                print(n)
-
-            
-                    
-
-            con.send(OutPacketGroup([]).data.data)
+                data = con.recv(1024)
+                #print(f"data: {data}, addr: {addr}")
+                if data[:1] == bytes([Framing.HELLO]):
+                    con.sendall(Status.NULL)
+                else:
+                    con.sendall(memoryview(self.handle(data)))
+            except OSError:
+                pass
             con.close()
-            continue
 
+    def handle(self, data):
+        instruments = self.instruments
+        if not instruments:
+            try:
+                return self._handle(data)
+            except Exception:
+                self._failed(data)
+                return OutPacketGroup([]).data
+        error = None
+        start = time.perf_counter()
+        try:
+            response = self._handle(data)
+        except Exception as e:
+            error = e
+            self._failed(data)
+            response = OutPacketGroup([]).data
+        elapsed = time.perf_counter() - start
+        typ = data[0] if data else None
+        for i in instruments:
+            i.record(typ, data, response, elapsed, error)
+        return response
+
+    def instrument(self, hook):
+        """Have hook.record(typ, data, response, elapsed, error) called after every packet"""
+        if hook not in self.instruments:
+            self.instruments = self.instruments + (hook,)
+
+    def uninstrument(self, hook):
+        self.instruments = tuple(i for i in self.instruments if i is not hook)
+
+    def _failed(self, data):
+        self.parseErrors += 1
+        print("[Proxy] Packet " + str(data) + " issued an invalid request!")
+        print(traceback.format_exc())
+
+    def _handle(self, data):
+        packet = Reader(data)
+        handler = self.handlers.get(packet.readByte())
+        if handler is None:
+            return OutPacketGroup([]).data
+        return handler(self, packet)
+
+
+class AsyncProxyListener(ProxyListener):
+    """Serves every connection from one asyncio event loop, so a slow client no longer stalls the others"""
+
+    def __init__(self, servers, server_list, opened_details, bungee, **kwargs):
+        self.timeout = kwargs.get("timeout", 10)
+        self.backlog = kwargs.get("backlog", 4096)
+        self.idle = kwargs.get("idle", 120)
+        self.workers = concurrent.futures.ThreadPoolExecutor(kwargs.get("workers", 4), thread_name_prefix = "proxy-worker")
+        super().__init__(servers, server_list, opened_details, bungee, **kwargs)
+
+    def listen(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.server = await asyncio.start_server(self.accept, self.host, self.port, backlog = self.backlog)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def accept(self, reader, writer):
+        try:
+            # one read, as the threaded listener does: a one-shot packet may be a single byte (0xe1)
+            data = await asyncio.wait_for(reader.read(1024), self.timeout)
+            if not data:
+                return
+            if data[0] == Framing.HELLO:
+                version = data[1:2] or await asyncio.wait_for(reader.readexactly(1), self.timeout)
+                if version[0] != Framing.VERSION:
+                    writer.write(Status.NULL)
+                    await writer.drain()
+                    return
+                writer.write(bytes([Framing.VERSION]))
+                await writer.drain()
+                await self.framed(reader, writer)
+                return
+            writer.write(await self.dispatch(data))
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def framed(self, reader, writer):
+        attached = []
+        try:
+            while True:
+                header = await asyncio.wait_for(reader.readexactly(Framing.HEADER.size), self.idle)
+                size, seq = Framing.HEADER.unpack(header)
+                if size > Framing.MAX_SIZE:
+                    self.LOG.warn(f"Closing framed connection: frame of {size} bytes exceeds the limit")
+                    return
+                if seq == Framing.PUSH:
+                    self.LOG.warn("Closing framed connection: request used the reserved push sequence")
+                    return
+                data = await asyncio.wait_for(reader.readexactly(size), self.timeout)
+                if data[:1] == b"\xee":
+                    try:
+                        destination = Reader(data[1:]).readString()
+                    except (IndexError, struct.error):
+                        destination = ""
+                    if destination != fanout.BUNGEE and self.server_list.getByFullId(destination) is None:
+                        self.LOG.warn(f"Closing framed connection: 0xee for unknown destination {destination!r}")
+                        return
+                    response = self.attach(destination, writer, attached)
+                else:
+                    response = await self.dispatch(data)
+                writer.write(Framing.HEADER.pack(len(response), seq))
+                writer.write(response)
+                await writer.drain()
+        finally:
+            for destination, push in attached:
+                self.fanout.detach(destination, push)
+
+    async def dispatch(self, data):
+        """Handles data inline, or on the worker pool if its handler is marked blocking"""
+        handler = self.handlers.get(data[0]) if data else None
+        if handler is None or not handler.blocking:
+            return self.handle(data)
+        return await asyncio.get_running_loop().run_in_executor(self.workers, self.handle, data)
+
+    def attach(self, destination, writer, attached):
+        """0xee: pushes for destination (a fullId, or "bungee") go down this connection from now on"""
+        loop = asyncio.get_running_loop()
+
+        def send(payload):
+            writer.write(Framing.HEADER.pack(len(payload), Framing.PUSH))
+            writer.write(payload)
+
+        def push(payload):
+            if writer.is_closing():
+                raise RuntimeError("connection closed")
+            loop.call_soon_threadsafe(send, bytes(payload))
+
+        attached.append((destination, push))
+        self.fanout.attach(destination, push)
+        return OutPacketGroup([]).data
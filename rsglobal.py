@@ -4,6 +4,10 @@ import os
 import shutil
 import random
 import propertyreader
+import catalog
+import ports
+import logstore
+import logtail
 import json
 import subprocess
 import threading
@@ -51,6 +55,28 @@ class SERVER_STATUS:
     RUNNING = "RUNNING"
     STOPPED = "STOPPED"
 
+# seconds without a 0xf0 ping before a server is dropped, overridable per server type
+SERVER_PING_TIMEOUT = 30
+SERVER_PING_TIMEOUT_BY_TYPE = {}
+
+# seconds a booted server may take to register (0x01) before it is given up on
+SERVER_BOOT_TIMEOUT = 300
+
+# hardlink jars and reflink the rest of a template instead of copying everything
+SERVER_PROVISION_LINK = True
+
+# standby servers kept booted by pool.WarmPool, e.g. {("standard-1.8.8", "S", "verify"): 2}
+SERVER_POOL = {}
+
+# autoscale.Policy arguments per server type, e.g. {"verify": {"headroom": 40, "maximum": 20}}
+SERVER_AUTOSCALE = {}
+
+# placement.PlacementEngine policy ("spread" or "binpack") per server type; types not listed spread
+SERVER_PLACEMENT = {}
+
+# heap each RAM class runs with in megabytes, to judge memory pressure from 0xf0 pings
+SERVER_RAM_MEGABYTES = {"T": 512, "S": 1024, "M": 2048, "B": 4096, "G": 8192}
+
 class UnsupportedOperationException(Exception):
     """Raised when a class are not supported to perform the targeted operation"""
 
@@ -98,6 +124,115 @@ class Alert:
         play = False
         print("L")
 
+class ServerRegistry:
+    """Every known DynamicServer, indexed by id, fullId, type and status. Iterates in registration order."""
+
+    def __init__(self, servers = ()):
+        self.lock = threading.RLock()
+        self.servers = {}
+        self.byId = {}
+        self.byType = {}
+        self.byStatus = {}
+        self.listeners = []
+        for i in servers:
+            self.append(i)
+
+    def __repr__(self):
+        return "ServerRegistry(" + ", ".join(self.servers) + ")"
+
+    def __len__(self):
+        return len(self.servers)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.servers.values()))
+
+    def __contains__(self, server):
+        return self.servers.get(server.fullId) is server
+
+    def __getitem__(self, index):
+        with self.lock:
+            return list(self.servers.values())[index]
+
+    def append(self, server):
+        with self.lock:
+            if server.fullId in self.servers:
+                raise ValueError("Server [RS-" + server.fullId + "] is already registered")
+            self.servers[server.fullId] = server
+            self.byId.setdefault(server.id, {})[server.fullId] = server
+            self.byType.setdefault(server.type, {})[server.fullId] = server
+            self.byStatus.setdefault(server.status, {})[server.fullId] = server
+            server.registry = self
+        self._notify("add", server)
+
+    def remove(self, server):
+        with self.lock:
+            if self.servers.get(server.fullId) is not server:
+                raise ValueError("Server [RS-" + server.fullId + "] is not registered")
+            del self.servers[server.fullId]
+            ServerRegistry._unindex(self.byId, server.id, server.fullId)
+            ServerRegistry._unindex(self.byType, server.type, server.fullId)
+            ServerRegistry._unindex(self.byStatus, server.status, server.fullId)
+            server.registry = None
+        self._notify("remove", server)
+
+    def discard(self, server):
+        try:
+            self.remove(server)
+        except ValueError:
+            return False
+        return True
+
+    def getById(self, sid):
+        """The first registered server with this id, whatever its RAM class"""
+        with self.lock:
+            for i in self.byId.get(sid, {}).values():
+                return i
+        return None
+
+    def getByFullId(self, fullId):
+        return self.servers.get(fullId)
+
+    def getByType(self, typ):
+        with self.lock:
+            return list(self.byType.get(typ, {}).values())
+
+    def getByStatus(self, status):
+        with self.lock:
+            return list(self.byStatus.get(status, {}).values())
+
+    def updateStatus(self, server, old, new):
+        with self.lock:
+            if server not in self:
+                return
+            ServerRegistry._unindex(self.byStatus, old, server.fullId)
+            self.byStatus.setdefault(new, {})[server.fullId] = server
+        self._notify("status", server)
+
+    def addListener(self, listener):
+        """listener(event, server) is called after every "add", "remove" and "status" change, outside the registry lock"""
+        self.listeners.append(listener)
+
+    def changed(self, server):
+        """Send listeners a "change" event for anything else about server, e.g. it started draining"""
+        if server in self:
+            self._notify("change", server)
+
+    def removeListener(self, listener):
+        self.listeners.remove(listener)
+
+    def _notify(self, event, server):
+        for i in list(self.listeners):
+            i(event, server)
+
+    def _unindex(index, key, fullId):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(fullId, None)
+        if not bucket:
+            del index[key]
+
 class DynamicServer:
 
     def format_players(self):
@@ -111,6 +246,7 @@ class DynamicServer:
         print(kwargs)
         self.id = kwargs.get("sid", actions.generateID(4))
         self.ramId = ramId
+        self.registry = None
         self.status = SERVER_STATUS.HIBERNATING
         self.version = version
         self.world = "_world_test1"
@@ -124,36 +260,25 @@ class DynamicServer:
         self.type = kwargs.get("type", "unknown")
         self.name = kwargs.get("name", f"{self.ramId}_{self.id}_{self.version}_{self.type}:unknown")
         self.process = None
+        self.console = None
+        self.tail = None
+        self.commandLock = threading.Lock()
         self.att = kwargs.get("attitude", "Normal")
-        self.logs = []
-        self.queued = []
+        self.queued = proxy.PacketQueue()
+        self.pooled = False
+        self.draining = False
+        self.registered = False
+
+        self.logs = logstore.LogStore()
 
         if kwargs.get("handleFile", True):
-            data = json.load(open("running.json"))
-
-            while True:
-                ok = random.randint(128, 32767)
-                if ok not in data["usedPorts"].keys():
-                    break
-            self.port = ok
-
-            data["usedPorts"][self.fullId] = self.port
-            json.dump(data, open("running.json", "w"))
-
-            DynamicServer._copyServer(version, self.fullId)
-            DynamicServer._copyProperty(version, self.fullId)
-            DynamicServer._copyWorld(self.world, "world", self.fullId)
-
-            properties = DynamicServer._loadProperty(self.fullId)
-
-            properties.put("server-port", self.port)
-            properties.put("max-players", self.maxplayers)
-            properties.put("sid", self.id)
-            properties.put("rid", self.ramId)
-            properties.put("version", self.version)
-            properties.put("type", self.type)
-            properties.put("name", self.name)
-            properties.save()
+            try:
+                self.allocate()
+                self.copy()
+                self.configure()
+            except Exception:
+                ports.allocator().release(self.fullId)
+                raise
         
 
         self.status = SERVER_STATUS.HIBERNATING
@@ -164,8 +289,31 @@ class DynamicServer:
             s.append(i + "=" + str(self.__dict__[i]))
         return "DynamicServer(" + ", ".join(s) + ")"
 
+    # the provisioning stages; handleFile runs all three from __init__, provision.Provisioner runs them on its workers
+
+    def allocate(self):
+        self.logs = logstore.LogStore(spill = "running\\" + self.fullId + "\\monitor-log.seg")
+        self.port = ports.allocator().allocate(self.fullId)
+
+    def copy(self):
+        DynamicServer._copyServer(self.version, self.fullId)
+        DynamicServer._copyWorld(self.world, "world", self.fullId)
+
+    def configure(self):
+        catalog.templates().render(self.version, "running\\" + self.fullId + "\\server.properties", {
+            "server-port": self.port,
+            "max-players": self.maxplayers,
+            "sid": self.id,
+            "rid": self.ramId,
+            "version": self.version,
+            "type": self.type,
+            "name": self.name
+        })
+
     def startUp(self) -> int:
         self.process = subprocess.Popen("startup-python.bat", stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=True, cwd='running\\' + self.fullId)
+        self.console = logtail.ConsoleDrain(self.process.stdout)
+        self.tail = logtail.LogTail("running\\" + self.fullId + "\\logs\\latest.log", "running\\" + self.fullId + "\\logs\\*.log.gz")
         self.status = SERVER_STATUS.LOADING
 
     def sendCommand(self, command: str) -> str:
@@ -173,19 +321,20 @@ class DynamicServer:
             _ = UnsupportedOperationException
             raise _(
                 "@DynamicServer.sendCommand WHILE #DynamicServer.status NOT_EQ str(RUNNING)")
-        self.process.stdin.write(bytes(command + "\r\n", "ascii"))
-        self.process.stdin.flush()
-        f = open("running\\" + self.fullId + "\\logs\\latest.log").readlines()
-        return f
+        with self.commandLock:
+            self.tail.read()
+            self.process.stdin.write(bytes(command + "\r\n", "ascii"))
+            self.process.stdin.flush()
+            return self.tail.waitFor()
 
     def _loadProperty(serverId: str) -> propertyreader.PropertyFile:
         return propertyreader.PropertyFile(open("running\\" + serverId + "\\server.properties")) 
 
     def _copyServer(templateName: str, serverId:str):
-        shutil.copytree("templates\\" + templateName + "\\world", "running\\" + serverId)
+        actions.provisionTree("templates\\" + templateName + "\\world", "running\\" + serverId, SERVER_PROVISION_LINK)
 
     def _copyWorld(worldId: str, dimension: str, serverId: str):
-        shutil.copytree("templates\\_worlds\\" + worldId, "running\\" + serverId + "\\" + dimension)
+        actions.provisionTree("templates\\_worlds\\" + worldId, "running\\" + serverId + "\\" + dimension, SERVER_PROVISION_LINK)
         #os.rename("running\\" + serverId + "\\" + worldId, "running\\" + serverId + "\\" + dimension)
 
     def _copyProperty(templateName: str, serverId: str):
@@ -194,18 +343,47 @@ class DynamicServer:
     def shutdown(self):
         self.queued.append(proxy.OutPacket(0xaf))
 
+    def kill(self):
+        """End the server's process tree at once, for servers that never got far enough to take an 0xaf"""
+        if self.process is None or self.process.poll() is not None:
+            return
+        if os.name == "nt":
+            # shell=True puts cmd.exe in front of the JVM; /T takes the JVM down with it
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(self.process.pid)], capture_output = True)
+        else:
+            self.process.kill()
+
+    def removeFiles(self):
+        self.logs.close()
+        shutil.rmtree("running\\" + self.fullId, ignore_errors = True)
+
     @property
     def fullId(self):
         return self.ramId + self.id
 
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        old = getattr(self, "_status", None)
+        self._status = value
+        if self.registry is not None and old != value:
+            self.registry.updateStatus(self, old, value)
+
 class BungeeServer:
 
     def __init__(self, ramId: str = "S", **kwargs):
         self.lastping = time.time()
         self.process = None
+        self.console = None
+        self.tail = None
+        self.commandLock = threading.Lock()
         self.att = kwargs.get("attitude", "Normal")
-        self.logs = []
-        self.queued = []
+        self.logs = logstore.LogStore()
+        self.queued = proxy.PacketQueue(4096)
+        self.playeramt = 0
         self.status = SERVER_STATUS.HIBERNATING
 
     def __repr__(self):
@@ -216,6 +394,8 @@ class BungeeServer:
 
     def startUp(self) -> int:
         self.process = subprocess.Popen("RUNME.bat", stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=True, cwd='bungeecord')
+        self.console = logtail.ConsoleDrain(self.process.stdout)
+        self.tail = logtail.LogTail("bungeecord\\proxy.log.0")
         self.status = SERVER_STATUS.LOADING
 
     def shutdown(self):
@@ -228,10 +408,11 @@ class BungeeServer:
             _ = UnsupportedOperationException
             raise _(
                 "@DynamicServer.sendCommand WHILE #DynamicServer.status NOT_EQ str(RUNNING)")
-        self.process.stdin.write(bytes(command + "\r\n", "ascii"))
-        self.process.stdin.flush()
-        f = open("running\\" + self.fullId + "\\logs\\latest.log").readlines()
-        return f
+        with self.commandLock:
+            self.tail.read()
+            self.process.stdin.write(bytes(command + "\r\n", "ascii"))
+            self.process.stdin.flush()
+            return self.tail.waitFor()
 
 
 if __name__ == "__main__":
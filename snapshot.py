@@ -0,0 +1,104 @@
+import collections
+import struct
+import threading
+import time
+
+SHORT = struct.Struct("<H")
+LONG = struct.Struct("<Q")
+HEADER = struct.Struct("<HH")
+
+FULL = 0
+DELTA = 1
+
+
+def _string(s):
+    b = s.encode("latin-1")
+    if len(b) > 65535:
+        raise TypeError("String is too long! Max len is 65535!")
+    return SHORT.pack(len(b)) + b
+
+
+class ServerListSnapshot:
+    """
+    The server list BungeeCord polls with 0xe2, kept encoded. Anything 0xe2
+    shows (a server added, removed, pooled or drained, renamed, or its player
+    count changing) bumps `generation`; between bumps every request gets the
+    same bytes, and a rebuild only re-encodes the rows of servers that changed.
+
+    0xe7 asks for the list as of a generation the client already has and gets
+    back only the rows changed since then plus the ids that dropped out, or
+    the whole list if that generation is older than the last `history` bumps.
+    Generations start from the startup time in the high 32 bits, so one handed
+    out before a monitor restart is always too old for a delta.
+    """
+
+    def __init__(self, registry, history = 4096):
+        self.registry = registry
+        self.generation = self.floor = int(time.time()) << 32
+        self.built = -1
+        self.rows = {}
+        self.dirty = set()
+        self.body = SHORT.pack(0)
+        self.changes = collections.deque(maxlen = history)
+        self.builds = 0
+        self.lock = threading.Lock()
+        registry.addListener(self._event)
+
+    def bump(self, server):
+        with self.lock:
+            self.generation += 1
+            if len(self.changes) == self.changes.maxlen:
+                self.floor = self.changes[0][0]
+            self.changes.append((self.generation, server.fullId))
+            self.dirty.add(server.fullId)
+
+    def full(self, name):
+        """0xe4 reply group: name, count, then fullId, name, players, maxplayers, type per server"""
+        with self.lock:
+            self._build()
+            body = self.body
+        return group(b"\xe4" + _string(name) + body)
+
+    def delta(self, name, since):
+        """0xe8 reply group: name, generation, FULL or DELTA, the rows as in 0xe4, then the removed fullIds"""
+        with self.lock:
+            self._build()
+            generation = self.generation
+            if since < self.floor or since > generation:
+                return group(b"\xe8" + _string(name) + LONG.pack(generation) + bytes((FULL,)) + self.body + SHORT.pack(0))
+            changed = set()
+            for g, fullId in reversed(self.changes):
+                if g <= since:
+                    break
+                changed.add(fullId)
+            rows = [self.rows[i] for i in changed if i in self.rows]
+            removed = [_string(i) for i in changed if i not in self.rows]
+        return group(b"\xe8" + _string(name) + LONG.pack(generation) + bytes((DELTA,))
+                     + SHORT.pack(len(rows)) + b"".join(rows) + SHORT.pack(len(removed)) + b"".join(removed))
+
+    def _build(self):
+        if self.built == self.generation:
+            return
+        rows = {}
+        for i in self.registry:
+            if i.pooled or i.draining:
+                continue
+            row = self.rows.get(i.fullId)
+            if row is None or i.fullId in self.dirty:
+                row = _string(i.fullId) + _string(i.name) + SHORT.pack(len(i.players)) + SHORT.pack(i.maxplayers) + _string(i.type)
+            rows[i.fullId] = row
+        self.rows = rows
+        self.body = SHORT.pack(len(rows)) + b"".join(rows.values())
+        self.dirty.clear()
+        self.built = self.generation
+        self.builds += 1
+
+    def _event(self, event, server):
+        self.bump(server)
+
+
+def group(packet):
+    """A one-packet OutPacketGroup around ready-made packet bytes"""
+    if len(packet) > 65535:
+        raise TypeError("Packet is too long to group! Max len is 65535!")
+    return HEADER.pack(1, len(packet)) + packet
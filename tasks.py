@@ -1,30 +1,121 @@
 import tkinter as tk
 import tkinter.messagebox as tkmsg
+import tkinter.filedialog as tkfile
 import rsglobal
 import time
 import windowc
+import metrics
 
 _TASKENV_MENU_SRVLIST_BOX_OPEN = False
 _TASKENV_MENU_SRVLIST_BOX_VAL = None
 _TASKENV_MENU_LASTUPD = time.time()
 
+class ServerTreeModel:
+    """Keeps a server Treeview in step with the server list by diffing rows keyed on fullId instead of rebuilding them"""
+
+    COLUMNS = ("number", "id", "name", "type", "status", "players", "tps", "ram", "att")
+
+    def __init__(self, servers):
+        self.servers = servers
+        self.rows = {}
+        self.serverlist = None
+        self.scheduled = False
+
+    def refresh(self, serverlist):
+        self.serverlist = serverlist
+        if not self.scheduled:
+            self.scheduled = True
+            self.servers.after_idle(self._apply)
+
+    def _row(n, i):
+        return (str(n), '[RS-' + i.fullId + "]", i.name, i.type, i.status, i.format_players(), str(i.tps), str(i.ramused) + " MB", i.att)
+
+    def _apply(self):
+        self.scheduled = False
+        rows = {}
+        n = 0
+        for i in self.serverlist:
+            n += 1
+            rows[i.fullId] = ServerTreeModel._row(n, i)
+
+        for fullId in self.rows:
+            if fullId not in rows:
+                self.servers.delete(fullId)
+        n = 0
+        for fullId, values in rows.items():
+            old = self.rows.get(fullId)
+            if old is None:
+                self.servers.insert('', n, iid=fullId, values=values, text="ERROR", tag = "warning")
+            elif old != values:
+                for column, a, b in zip(self.COLUMNS, old, values):
+                    if a != b:
+                        self.servers.set(fullId, column, b)
+            n += 1
+        self.rows = rows
+
+_TASKENV_SERVER_MODELS = {}
+
 def _task_update_server_list(servers: "tkinter", serverlist):
     global _TASKENV_MENU_LASTUPD
-    for item in servers.get_children():
-        servers.delete(item)
-    n = 0
-    for i in serverlist:
-        if time.time() - i.lastping > 30:
-            tkmsg.showwarning('[RS-' + i.fullId + "] Server Lost Track", "This server was removed from the protocol because it didn't ping in the last 30 seconds!\n\nPlease check if there is an error, and try and patch it.")
-            serverlist.remove(i)
-            continue
-        n += 1
-        servers.insert('', tk.END, values=(str(n), '[RS-' + i.fullId + "]", i.name, i.type, i.status, i.format_players(), str(i.tps), str(i.ramused) + " MB", i.att), text="ERROR", tag = "warning")
+    model = _TASKENV_SERVER_MODELS.get(str(servers))
+    if model is None:
+        model = ServerTreeModel(servers)
+        _TASKENV_SERVER_MODELS[str(servers)] = model
+    model.refresh(serverlist)
     _TASKENV_MENU_LASTUPD = time.time()
 
+_TASKENV_LOST_WINDOW = None
+
+def _notify_lost(root, lost):
+    global _TASKENV_LOST_WINDOW
+    lines = [time.strftime("%H:%M:%S") + "  [RS-" + i.fullId + "] " + i.name + " (" + i.type + ")" for i in lost]
+    if _TASKENV_LOST_WINDOW is None or not _TASKENV_LOST_WINDOW.winfo_exists():
+        w = tk.Toplevel(root)
+        w.title("Server Lost Track")
+        w.geometry("500x300")
+        tk.Label(w, text = "These servers were removed from the protocol because they stopped pinging.\nPlease check if there is an error, and try and patch it.", justify = "left").pack(anchor = "w")
+        w.list = tk.Listbox(w)
+        w.list.pack(fill = "both", expand = True)
+        _TASKENV_LOST_WINDOW = w
+    for i in lines:
+        _TASKENV_LOST_WINDOW.list.insert(tk.END, i)
+
 def _menu_createBan():
     pass
 
+def _toggle_instrument(listener, name, on):
+    if listener is None:
+        tkmsg.showerror("Proxy", "The proxy listener is not running yet!")
+        return
+    if on:
+        listener.instrument(getattr(listener, name))
+    else:
+        listener.uninstrument(getattr(listener, name))
+
+def _show_profile(listener):
+    if listener is None:
+        tkmsg.showerror("Proxy", "The proxy listener is not running yet!")
+        return
+    lines = listener.profile.report()
+    tkmsg.showinfo("Proxy Opcode Profile", "\n".join(lines) if lines else "No packets profiled yet.")
+
+def _dump_trace(listener):
+    if listener is None:
+        tkmsg.showerror("Proxy", "The proxy listener is not running yet!")
+        return
+    path = tkfile.asksaveasfilename(title = "Dump Proxy Trace", defaultextension = ".jsonl", filetypes = [("JSON lines", "*.jsonl")])
+    if not path:
+        return
+    n = listener.tracer.dump(path)
+    tkmsg.showinfo("Dump Proxy Trace", f"Wrote {n} sampled packets to {path}")
+
+def _export_metrics():
+    path = tkfile.asksaveasfilename(title = "Export Metrics Snapshot", defaultextension = ".rsmt", filetypes = [("Metrics snapshot", "*.rsmt")])
+    if not path:
+        return
+    size = metrics.store().export(path)
+    tkmsg.showinfo("Export Metrics Snapshot", f"Saved history of {len(metrics.store())} servers ({size // 1024} KiB) to {path}")
+
 def _menu_SrvrList_(servers: "tkinter"):
     global _TASKENV_MENU_SRVLIST_BOX_OPEN, _TASKENV_MENU_SRVLIST_BOX_VAL
     
@@ -57,6 +148,13 @@ def _menu_SrvrList_(servers: "tkinter"):
     b1 = tk.Button(ask, text = "Go!", command = lambda: a(servers, ask, e1.get()))
     b1.pack()
 
-def _create_new(servers, l, b):
-    windowc.CreateNew(l, servers, b)
+def _create_new(servers, l, b, pool = None, provisioner = None):
+    windowc.CreateNew(l, servers, b, pool, provisioner)
+
+def _provisioned(servers, l, job):
+    _task_update_server_list(servers, l)
+
+def _provision_failed(servers, l, job):
+    _task_update_server_list(servers, l)
+    tkmsg.showerror("Unable to Create Server", f"[RS-{job.server.fullId}] could not be provisioned ({job.stage}): {job.error}")
     
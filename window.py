@@ -11,6 +11,14 @@ import os
 import subprocess
 import sys
 import logger
+import liveness
+import pool
+import provision
+import autoscale
+import catalog
+import metrics
+import ports
+import exporter
 
 
 root = tk.Tk()
@@ -45,23 +53,21 @@ servers.column("att", width=150)
 servers.pack(fill = "both")
 
 def servers_rightclick(event):
-    item = servers.item(servers.focus())
-    if item == '':
+    srv = SERVER_LIST.getByFullId(servers.focus())
+    if srv is None:
         allow = "disabled"
     else:
         allow = "normal"
     m = tk.Menu(root, tearoff = 0)
-    m.add_command(label = "Open selected server in file explorer", command = lambda: subprocess.Popen("explorer \"" + os.getcwd() + "\\running\\" + SERVER_LIST[int(item["values"][0]) - 1].fullId + "\""), state = allow)
-    m.add_command(label = "Shut down selected server", command = lambda: SERVER_LIST[int(item["values"][0]) - 1].shutdown(), state = allow)
+    m.add_command(label = "Open selected server in file explorer", command = lambda: subprocess.Popen("explorer \"" + os.getcwd() + "\\running\\" + srv.fullId + "\""), state = allow)
+    m.add_command(label = "Shut down selected server", command = lambda: srv.shutdown(), state = allow)
     m.tk_popup(event.x_root, event.y_root)
     m.grab_release()
 
 def click(li):
     sid = li.item(li.selection())["values"][1]
-    for i in SERVER_LIST:
-        if i.fullId in sid:
-            break
-    else:
+    i = SERVER_LIST.getByFullId(sid[len("[RS-"):-1])
+    if i is None:
         tkmsg.showerror("Server Monitor", "The server you specified does not exists. Maybe the server was removed? Please check for the server's validation.")
         tasks._task_update_server_list(servers, SERVER_LIST)
         return
@@ -80,13 +86,24 @@ root.config(menu = menu)
 
 menuApp = tk.Menu(menu, tearoff="off")
 menuApp.add_command(label="Preferences")
+menuApp.add_command(label="Export Metrics Snapshot...", command = lambda: tasks._export_metrics())
 menu.add_cascade(label="Options", menu=menuApp)
 
+PROFILING = tk.BooleanVar(root, value = True)
+TRACING = tk.BooleanVar(root, value = False)
+menuProxy = tk.Menu(menu, tearoff="off")
+menuProxy.add_checkbutton(label="Profile Opcodes", variable=PROFILING, command = lambda: tasks._toggle_instrument(server, "profile", PROFILING.get()))
+menuProxy.add_checkbutton(label="Sample Packet Traces", variable=TRACING, command = lambda: tasks._toggle_instrument(server, "tracer", TRACING.get()))
+menuProxy.add_separator()
+menuProxy.add_command(label="Show Opcode Profile", command = lambda: tasks._show_profile(server))
+menuProxy.add_command(label="Dump Packet Traces...", command = lambda: tasks._dump_trace(server))
+menu.add_cascade(label="Proxy", menu=menuProxy)
+
 menuServerList = tk.Menu(menu, tearoff="off")
 menuServerList.add_command(label="Go To Line...", command = lambda: tasks._menu_SrvrList_(servers))
 menuServerList.add_separator()
 menuServerList.add_command(label="Refresh", command = lambda: tasks._task_update_server_list(servers, SERVER_LIST))
-menuServerList.add_command(label="Create New Server", command = lambda: tasks._create_new(servers, SERVER_LIST, BUNGEE))
+menuServerList.add_command(label="Create New Server", command = lambda: tasks._create_new(servers, SERVER_LIST, BUNGEE, POOL, PROVISIONER))
 menuServerList.add_separator()
 menuServerList.add_command(label="BungeeCord Options", command = lambda: tasks._bungee(servers, SERVER_LIST))
 menu.add_cascade(label="Servers", menu=menuServerList)
@@ -108,9 +125,11 @@ servers.bind("<Leave>", lambda i: hint.config(text=""))
 menu.bind("<Enter>", lambda i: hint.config(text="Ugh are you really gonna use these?"))
 menu.bind("<Leave>", lambda i: hint.config(text=""))
 
-SERVER_LIST = []
+SERVER_LIST = rsglobal.ServerRegistry()
 OPEN_DETAILS = []
 BUNGEE = None
+POOL = None
+PROVISIONER = None
 LAST_UPD = time.time()
 server = None
 
@@ -127,14 +146,16 @@ def upd(t):
 
 def s(s, SERVER_LIST, BUNGEE):
     global server
-    server = proxy.ProxyListener(s, SERVER_LIST, OPEN_DETAILS, BUNGEE)
+    server = proxy.AsyncProxyListener(s, SERVER_LIST, OPEN_DETAILS, BUNGEE, autostart = False)
+    exporter.MetricsExporter(SERVER_LIST, server).start()
+    server.listen()
 
 def launch():
     pass
 
 def delete():
     for i in os.listdir("running"):
-        if not i in [x.fullId for x in SERVER_LIST]:
+        if SERVER_LIST.getByFullId(i) is None:
             try:
                 os.rmdir("running\\" + i)
             except:
@@ -172,9 +193,25 @@ LOG.info("Setting up thread functions...")
 root.after(1000, lambda: upd(LAST_UPD))
 root.after(1, launch)
 root.after(1, delete)
+LOG.info("Loading server templates...")
+catalog.templates()
+metrics.store().watch(SERVER_LIST)
+ports.allocator().watch(SERVER_LIST)
+LOG.info("Starting liveness monitor...")
+LIVENESS = liveness.LivenessMonitor(SERVER_LIST, onExpire = lambda lost: root.after(0, lambda: tasks._notify_lost(root, lost)))
+LIVENESS.start()
+LOG.info("Starting warm server pool...")
+POOL = pool.WarmPool(SERVER_LIST)
+LOG.info("Starting provisioning workers...")
+PROVISIONER = provision.Provisioner(SERVER_LIST,
+                                    onComplete = lambda job: root.after(0, lambda: tasks._provisioned(servers, SERVER_LIST, job)),
+                                    onFailed = lambda job: root.after(0, lambda: tasks._provision_failed(servers, SERVER_LIST, job)))
 LOG.info("Loading bungeecord servers...")
 BUNGEE = rsglobal.BungeeServer()
 BUNGEE.startUp()
+LOG.info("Starting autoscaler...")
+AUTOSCALER = autoscale.Autoscaler(SERVER_LIST, {typ: autoscale.Policy(**kw) for typ, kw in rsglobal.SERVER_AUTOSCALE.items()}, bungee = BUNGEE, provisioner = PROVISIONER)
+AUTOSCALER.start()
 LOG.info("Completing I/O protocol threading...")
 x = threading.Thread(target = lambda: s(servers, SERVER_LIST, BUNGEE))
 x.start()
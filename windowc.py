@@ -16,13 +16,16 @@ import tasks
 import traceback
 import proxy
 import datetime
+import metrics
 
 class CreateNew:
-    def __init__(self, home, servers, bungee):
+    def __init__(self, home, servers, bungee, pool = None, provisioner = None):
         self.servers = servers
         #setting title
         self.home = home
         self.bungee = bungee
+        self.pool = pool
+        self.provisioner = provisioner
         root = tk.Tk()
         self.root = root
         root.title("Create Server")
@@ -114,61 +117,71 @@ class CreateNew:
         self.typ.place(x=80,y=255,width=370,height=20)
         self.typ.insert(0, "verify")
 
+        sb=tk.Label(root, wraplengt = 475)
+        sb["anchor"] = "w"
+        sb["justify"] = "left"
+        sb["text"] = "Amount"
+        sb.place(x=10,y=280,width=501,height=30)
+
+        self.count=tk.Entry(root)
+        self.count.place(x=80,y=285,width=370,height=20)
+        self.count.insert(0, "1")
+
         n=tk.Label(root, wraplengt = 475, font = ("arial bold", 10))
         n["anchor"] = "w"
         n["justify"] = "left"
         n["text"] = "Advanced Settings"
-        n.place(x=10,y=290,width=476,height=30)
+        n.place(x=10,y=320,width=476,height=30)
 
         GLabel_588=tk.Label(root, wraplengt = 475)
         GLabel_588["anchor"] = "w"
         GLabel_588["justify"] = "left"
         GLabel_588["text"] = "Advanced settings allows you to customize the server's group tags, properties, and other."
-        GLabel_588.place(x=10,y=320,width=476,height=15)
+        GLabel_588.place(x=10,y=350,width=476,height=15)
 
         GButton_301=tk.Button(root)
         GButton_301["justify"] = "center"
         GButton_301["text"] = "Edit Group Tags"
-        GButton_301.place(x=10,y=350,width=100,height=25)
+        GButton_301.place(x=10,y=380,width=100,height=25)
 
         GLabel_588=tk.Label(root, wraplengt = 475)
         GLabel_588["anchor"] = "w"
         GLabel_588["justify"] = "left"
         GLabel_588["text"] = "Edit server's role in a group."
-        GLabel_588.place(x=120,y=355,width=330,height=15)
+        GLabel_588.place(x=120,y=385,width=330,height=15)
 
         GButton_301=tk.Button(root)
         GButton_301["justify"] = "center"
         GButton_301["text"] = "Properties"
-        GButton_301.place(x=10,y=380,width=100,height=25)
+        GButton_301.place(x=10,y=410,width=100,height=25)
 
         GLabel_588=tk.Label(root, wraplengt = 475)
         GLabel_588["anchor"] = "w"
         GLabel_588["justify"] = "left"
         GLabel_588["text"] = "Edit server's properties file. Not changable after made."
-        GLabel_588.place(x=120,y=385,width=330,height=15)
+        GLabel_588.place(x=120,y=415,width=330,height=15)
 
         GButton_301=tk.Button(root)
         GButton_301["justify"] = "center"
         GButton_301["text"] = "Plugins"
-        GButton_301.place(x=10,y=410,width=100,height=25)
+        GButton_301.place(x=10,y=440,width=100,height=25)
 
         GLabel_588=tk.Label(root, wraplengt = 475)
         GLabel_588["anchor"] = "w"
         GLabel_588["justify"] = "left"
         GLabel_588["text"] = "Edit server's default plugins. Not changable after made."
-        GLabel_588.place(x=120,y=415,width=330,height=15)
+        GLabel_588.place(x=120,y=445,width=330,height=15)
 
         GButton_301=tk.Button(root)
         GButton_301["justify"] = "center"
         GButton_301["text"] = "Template"
-        GButton_301.place(x=10,y=440,width=100,height=25)
+        GButton_301.place(x=10,y=470,width=100,height=25)
 
         GLabel_588=tk.Label(root, wraplengt = 475)
         GLabel_588["anchor"] = "w"
         GLabel_588["justify"] = "left"
         GLabel_588["text"] = "Select a template for the server."
-        GLabel_588.place(x=120,y=445,width=330,height=15)
+        GLabel_588.place(x=120,y=475,width=330,height=15)
 
         sep = ttk.Separator(root, orient='horizontal')
         sep.place(x=0, y = 655, width = 501)
@@ -224,14 +237,42 @@ class CreateNew:
         args["type"] = self.typ.get()
 
         try:
-            s = rsglobal.DynamicServer("standard-1.8.8", "S", **args)
-        except Exception as e:
-            tkmsg.showerror("Unable to Create Server", "An problem occured while creating server: " + str(e) + "\n\n" + traceback.format_exc())
+            count = int(self.count.get())
+        except ValueError:
+            tkmsg.showerror("Unable to Create Server", "Amount must be a whole number!")
+            return
+        if count < 1 or count > 1 and not _AUTO_ID:
+            tkmsg.showerror("Unable to Create Server", "Amount must be at least 1, and more than 1 server needs auto generated IDs!")
+            return
+
+        if self.pool is not None and _AUTO_NAME and _AUTO_ID:
+            while count > 0 and self.pool.acquire("standard-1.8.8", "S", args["type"]) is not None:
+                count -= 1
+            if count == 0:
+                self.root.destroy()
+                tasks._task_update_server_list(self.servers, self.home)
+                return
+
+        if self.provisioner is not None:
+            try:
+                self.provisioner.request("standard-1.8.8", "S", count, **args)
+            except ValueError as e:
+                tkmsg.showerror("Unable to Create Server", str(e))
+                return
+            self.root.destroy()
+            tasks._task_update_server_list(self.servers, self.home)
             return
 
-        s.startUp()
+        for n in range(count):
+            try:
+                s = rsglobal.DynamicServer("standard-1.8.8", "S", **args)
+            except Exception as e:
+                tkmsg.showerror("Unable to Create Server", "An problem occured while creating server: " + str(e) + "\n\n" + traceback.format_exc())
+                return
+
+            s.startUp()
+            self.home.append(s)
         self.root.destroy()
-        self.home.append(s)
         tasks._task_update_server_list(self.servers, self.home)
 
 class Details:
@@ -249,6 +290,9 @@ class Details:
         self.log = ttk.Frame(self.nb)
         self.nb.add(self.log, text = "Live Log")
 
+        self.graphs = ttk.Frame(self.nb)
+        self.nb.add(self.graphs, text = "Metrics")
+
         self.nb.place(x=1, y=1, width=800, height=500)
         
         self.server = dedicated
@@ -309,8 +353,30 @@ class Details:
         self.logs.heading("message", text="Message")
         self.logs.column("message", width = 700)
         self.logs.pack(fill = "both")
-        for i in self.server.logs:
-            self.logs.insert('', tk.END, values=(datetime.datetime.fromtimestamp(i["time"]).strftime("%H:%M:%S"), i["level"], i["msg"]))
+
+        self.logNav = tk.Frame(self.log)
+        self.logNav.pack(fill = "x")
+        tk.Button(self.logNav, text = "< Older", command = lambda: self.show_logs(self.logStart - self.LOG_PAGE)).pack(side = tk.LEFT)
+        tk.Button(self.logNav, text = "Newer >", command = lambda: self.show_logs(self.logStart + self.LOG_PAGE)).pack(side = tk.LEFT)
+        tk.Button(self.logNav, text = "Latest", command = lambda: self.show_logs(None)).pack(side = tk.LEFT)
+        self.logInfo = tk.Label(self.logNav)
+        self.logInfo.pack(side = tk.LEFT)
+        self.logStart = 0
+        self.logShown = -1
+        self.logFollow = True
+        self.show_logs(None)
+
+        self.graphWidth = tk.IntVar(self.root, value = 1)
+        graphNav = tk.Frame(self.graphs)
+        graphNav.pack(fill = "x")
+        for text, width in (("Last 10 minutes", 1), ("Last day", 60), ("Last week", 3600)):
+            tk.Radiobutton(graphNav, text = text, variable = self.graphWidth, value = width, command = self.show_graphs).pack(side = tk.LEFT)
+        self.sparks = {}
+        for field, label in self.GRAPHS:
+            tk.Label(self.graphs, text = label, anchor = "w").pack(fill = "x")
+            self.sparks[field] = tk.Canvas(self.graphs, height = 90, background = "white")
+            self.sparks[field].pack(fill = "x", padx = 4)
+        self.show_graphs()
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_exit)
         self.root.after(1000, self.update)
@@ -343,8 +409,63 @@ class Details:
             else:
                 self.player_list.insert('', tk.END, values=(p[3], p[0], p[2]))
         
+        if self.logFollow and self.logShown != len(self.server.logs):
+            self.show_logs(None)
+        self.show_graphs()
+
         self.root.after(1000, self.update)
 
+    LOG_PAGE = 200
+
+    def show_logs(self, start):
+        store = self.server.logs
+        self.logFollow = start is None or start + self.LOG_PAGE >= len(store)
+        if self.logFollow:
+            start = len(store) - self.LOG_PAGE
+        start = max(store.first, start)
+        self.logStart = start
+        self.logShown = len(store)
+        for item in self.logs.get_children():
+            self.logs.delete(item)
+        lines = store.page(start, self.LOG_PAGE)
+        for n, t, level, msg in lines:
+            self.logs.insert('', tk.END, values=(datetime.datetime.fromtimestamp(t).strftime("%H:%M:%S"), level, msg))
+        if lines:
+            self.logInfo["text"] = f"Lines {lines[0][0] + 1}-{lines[-1][0] + 1} of {len(store)}"
+        else:
+            self.logInfo["text"] = "No log lines yet"
+        if self.logFollow:
+            self.logs.yview_moveto(1)
+
+    GRAPHS = (("tps", "TPS (bucket mean, red: lowest)"), ("ram", "RAM Usage (bucket mean, red: highest)"), ("players", "Players"))
+    EXTREMES = {"tps": "tpsMin", "ram": "ramMax"}
+
+    def show_graphs(self):
+        width = self.graphWidth.get()
+        for field, label in self.GRAPHS:
+            canvas = self.sparks[field]
+            canvas.delete("all")
+            w = int(canvas.winfo_width()) if canvas.winfo_width() > 1 else 780
+            h = int(canvas["height"])
+            points = metrics.store().history(self.server.fullId, field, width, w // 2)
+            if len(points) < 2:
+                canvas.create_text(w // 2, h // 2, text = "Not enough samples yet")
+                continue
+            lines = [(points, "blue")]
+            if field in self.EXTREMES:
+                lines.insert(0, (metrics.store().history(self.server.fullId, self.EXTREMES[field], width, w // 2), "red"))
+            low = min(v for line, colour in lines for t, v in line)
+            high = max(v for line, colour in lines for t, v in line)
+            span = (high - low) or 1
+            for line, colour in lines:
+                step = (w - 60) / (len(line) - 1)
+                coords = []
+                for n, (t, v) in enumerate(line):
+                    coords += [n * step, h - 5 - (v - low) / span * (h - 10)]
+                canvas.create_line(*coords, fill = colour)
+            canvas.create_text(w - 5, 5, text = f"{high:.1f}", anchor = "ne")
+            canvas.create_text(w - 5, h - 5, text = f"{low:.1f}", anchor = "se")
+
     def player_right_click(self, event):
         item = self.player_list.item(self.player_list.focus())["values"]
         if item == '':